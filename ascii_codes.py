@@ -0,0 +1,132 @@
+# Generated by upacket.bake_codes() from ascii-table.txt
+# and ascii-tweaks.txt, do not edit by hand
+CODES = (
+  ( 0, 'u+0000', 'NUL', 'NUL', '' ),
+  ( 1, 'u+0001', 'SOH', 'SOH', '' ),
+  ( 2, 'u+0002', 'STX', 'STX', '' ),
+  ( 3, 'u+0003', 'ETX', 'ETX', '' ),
+  ( 4, 'u+0004', 'EOT', 'EOT', '' ),
+  ( 5, 'u+0005', 'ENQ', 'ENQ', '' ),
+  ( 6, 'u+0006', 'ACK', 'ACK', '' ),
+  ( 7, 'u+0007', 'BEL', 'BEL', '' ),
+  ( 8, 'u+0008', 'BS', 'BS', '' ),
+  ( 9, 'u+0009', '␉', 'HT', '' ),
+  ( 10, 'u+000a', '␊', 'LF', '' ),
+  ( 11, 'u+000b', '␋', 'VT', '' ),
+  ( 12, 'u+000c', '␌', 'FF', '' ),
+  ( 13, 'u+000d', '␍', 'CR', '' ),
+  ( 14, 'u+000e', 'SO', 'SO', '' ),
+  ( 15, 'u+000f', 'SI', 'SI', '' ),
+  ( 16, 'u+0010', 'DLE', 'DLE', '' ),
+  ( 17, 'u+0011', 'DC1', 'DC1', '' ),
+  ( 18, 'u+0012', 'DC2', 'DC2', '' ),
+  ( 19, 'u+0013', 'DC3', 'DC3', '' ),
+  ( 20, 'u+0014', 'DC4', 'DC4', '' ),
+  ( 21, 'u+0015', 'NAK', 'NAK', '' ),
+  ( 22, 'u+0016', 'SYN', 'SYN', '' ),
+  ( 23, 'u+0017', 'ETB', 'ETB', '' ),
+  ( 24, 'u+0018', 'CAN', 'CAN', '' ),
+  ( 25, 'u+0019', 'EM ', 'EM ', '' ),
+  ( 26, 'u+001a', 'SUB', 'SUB', '' ),
+  ( 27, 'u+001b', 'ESC', 'ESC', '' ),
+  ( 28, 'u+001c', 'FS', 'FS', '' ),
+  ( 29, 'u+001d', 'GS', 'GS', '' ),
+  ( 30, 'u+001e', 'RS', 'RS', '' ),
+  ( 31, 'u+001f', 'US', 'US', '' ),
+  ( 32, 'u+0020', '␣', ' ', '' ),
+  ( 33, 'u+0021', '!', '!', '' ),
+  ( 34, 'u+0022', '"', '"', '' ),
+  ( 35, 'u+0023', '#', '#', '' ),
+  ( 36, 'u+0024', '$', '$', '' ),
+  ( 37, 'u+0025', '%', '%', '' ),
+  ( 38, 'u+0026', '&', '&', '' ),
+  ( 39, 'u+0027', "'", "'", '' ),
+  ( 40, 'u+0028', '(', '(', '' ),
+  ( 41, 'u+0029', ')', ')', '' ),
+  ( 42, 'u+002a', '*', '*', '' ),
+  ( 43, 'u+002b', '+', '+', '' ),
+  ( 44, 'u+002c', ',', ',', '' ),
+  ( 45, 'u+002d', '-', '-', '' ),
+  ( 46, 'u+002e', '.', '.', '' ),
+  ( 47, 'u+002f', '/', '/', '' ),
+  ( 48, 'u+0030', '0', '0', '' ),
+  ( 49, 'u+0031', '1', '1', '' ),
+  ( 50, 'u+0032', '2', '2', '' ),
+  ( 51, 'u+0033', '3', '3', '' ),
+  ( 52, 'u+0034', '4', '4', '' ),
+  ( 53, 'u+0035', '5', '5', '' ),
+  ( 54, 'u+0036', '6', '6', '' ),
+  ( 55, 'u+0037', '7', '7', '' ),
+  ( 56, 'u+0038', '8', '8', '' ),
+  ( 57, 'u+0039', '9', '9', '' ),
+  ( 58, 'u+003a', ':', ':', '' ),
+  ( 59, 'u+003b', ';', ';', '' ),
+  ( 60, 'u+003c', '<', '<', '' ),
+  ( 61, 'u+003d', '=', '=', '' ),
+  ( 62, 'u+003e', '>', '>', '' ),
+  ( 63, 'u+003f', '?', '?', '' ),
+  ( 64, 'u+0040', '@', '@', '' ),
+  ( 65, 'u+0041', 'A', 'A', '' ),
+  ( 66, 'u+0042', 'B', 'B', '' ),
+  ( 67, 'u+0043', 'C', 'C', '' ),
+  ( 68, 'u+0044', 'D', 'D', '' ),
+  ( 69, 'u+0045', 'E', 'E', '' ),
+  ( 70, 'u+0046', 'F', 'F', '' ),
+  ( 71, 'u+0047', 'G', 'G', '' ),
+  ( 72, 'u+0048', 'H', 'H', '' ),
+  ( 73, 'u+0049', 'I', 'I', '' ),
+  ( 74, 'u+004a', 'J', 'J', '' ),
+  ( 75, 'u+004b', 'K', 'K', '' ),
+  ( 76, 'u+004c', 'L', 'L', '' ),
+  ( 77, 'u+004d', 'M', 'M', '' ),
+  ( 78, 'u+004e', 'N', 'N', '' ),
+  ( 79, 'u+004f', 'O', 'O', '' ),
+  ( 80, 'u+0050', 'P', 'P', '' ),
+  ( 81, 'u+0051', 'Q', 'Q', '' ),
+  ( 82, 'u+0052', 'R', 'R', '' ),
+  ( 83, 'u+0053', 'S', 'S', '' ),
+  ( 84, 'u+0054', 'T', 'T', '' ),
+  ( 85, 'u+0055', 'U', 'U', '' ),
+  ( 86, 'u+0056', 'V', 'V', '' ),
+  ( 87, 'u+0057', 'W', 'W', '' ),
+  ( 88, 'u+0058', 'X', 'X', '' ),
+  ( 89, 'u+0059', 'Y', 'Y', '' ),
+  ( 90, 'u+005a', 'Z', 'Z', '' ),
+  ( 91, 'u+005b', '[', '[', '' ),
+  ( 92, 'u+005c', '\\', '\\', '' ),
+  ( 93, 'u+005d', ']', ']', '' ),
+  ( 94, 'u+005e', '^', '^', '' ),
+  ( 95, 'u+005f', '_', '_', '' ),
+  ( 96, 'u+0060', '`', '`', '' ),
+  ( 97, 'u+0061', 'a', 'a', '' ),
+  ( 98, 'u+0062', 'b', 'b', '' ),
+  ( 99, 'u+0063', 'c', 'c', '' ),
+  ( 100, 'u+0064', 'd', 'd', '' ),
+  ( 101, 'u+0065', 'e', 'e', '' ),
+  ( 102, 'u+0066', 'f', 'f', '' ),
+  ( 103, 'u+0067', 'g', 'g', '' ),
+  ( 104, 'u+0068', 'h', 'h', '' ),
+  ( 105, 'u+0069', 'i', 'i', '' ),
+  ( 106, 'u+006a', 'j', 'j', '' ),
+  ( 107, 'u+006b', 'k', 'k', '' ),
+  ( 108, 'u+006c', 'l', 'l', '' ),
+  ( 109, 'u+006d', 'm', 'm', '' ),
+  ( 110, 'u+006e', 'n', 'n', '' ),
+  ( 111, 'u+006f', 'o', 'o', '' ),
+  ( 112, 'u+0070', 'p', 'p', '' ),
+  ( 113, 'u+0071', 'q', 'q', '' ),
+  ( 114, 'u+0072', 'r', 'r', '' ),
+  ( 115, 'u+0073', 's', 's', '' ),
+  ( 116, 'u+0074', 't', 't', '' ),
+  ( 117, 'u+0075', 'u', 'u', '' ),
+  ( 118, 'u+0076', 'v', 'v', '' ),
+  ( 119, 'u+0077', 'w', 'w', '' ),
+  ( 120, 'u+0078', 'x', 'x', '' ),
+  ( 121, 'u+0079', 'y', 'y', '' ),
+  ( 122, 'u+007a', 'z', 'z', '' ),
+  ( 123, 'u+007b', '{', '{', '' ),
+  ( 124, 'u+007c', '|', '|', '' ),
+  ( 125, 'u+007d', '}', '}', '' ),
+  ( 126, 'u+007e', '~', '~', '' ),
+  ( 127, 'u+007f', 'DEL', 'DEL', '' ),
+)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Full duplex rtester on asyncio. The serial port file descriptor
+# is watched by the event loop, and transmit, receive, verification
+# and logging run as separate tasks joined by bounded queues:
+#
+#   transmit --> port --> receive --> verify --> log
+#
+# Packets carry sequence numbers and up to window of them are in
+# flight, as with Tester.run_window(). A full queue holds back the
+# task feeding it, so a slow log write delays the checking but
+# never the wire, and a slow checker stops the port being read
+# rather than losing frames.
+#   ./atester.py [portname] [window]
+
+import sys
+import os
+import io
+import time
+import asyncio
+import serial
+import upacket
+import rtester
+
+class Async_port:
+  # A serial port in non-blocking mode, read and written through the
+  # event loop. Received bytes are decoded into frames as they come in
+  # and queued for recv(); once limit frames are waiting the port is no
+  # longer read, and further data waits in the driver.
+  def __init__(self, portname='/dev/ttyUSB0', baud=115200, framing='text', limit=64):
+    self.portname = portname
+    self.baud = baud
+    self.port = serial.Serial( portname, baudrate=baud, timeout=0 )
+    print(self.port.name)
+    self.port.reset_input_buffer()
+    self.port.reset_output_buffer()
+    self.fd = self.port.fileno()
+    os.set_blocking( self.fd, False )
+    self.framing = upacket.FRAMINGS[framing]
+    self.decoder = self.framing.decoder()
+    self.limit = limit
+    self.frames = asyncio.Queue()
+    self.loop = asyncio.get_running_loop()
+    self.reading = False
+    self.resume()
+
+  def resume(self):
+    if self.reading: return
+    self.loop.add_reader( self.fd, self.readable )
+    self.reading = True
+
+  def pause(self):
+    if not self.reading: return
+    self.loop.remove_reader( self.fd )
+    self.reading = False
+
+  def readable(self):
+    try:
+      buff = os.read( self.fd, 4096 )
+    except BlockingIOError:
+      return
+    for frame in self.decoder.feed(buff):
+      self.frames.put_nowait(frame)
+    if self.frames.qsize() >= self.limit: self.pause()
+
+  async def recv(self):
+    frame = await self.frames.get()
+    if self.frames.qsize() < self.limit: self.resume()
+    return frame
+
+  async def send(self, packet):
+    # all of the framed packet, waiting for room in the driver as needed
+    if isinstance(packet, str): packet = bytes(packet, 'latin_1')
+    view = memoryview( self.framing.frame(packet) )
+    nsent = 0
+    while nsent < len(view):
+      try:
+        nsent += os.write( self.fd, view[nsent:] )
+      except BlockingIOError:
+        await self.writable()
+    return nsent
+
+  def writable(self):
+    ready = self.loop.create_future()
+    def wake():
+      self.loop.remove_writer( self.fd )
+      if not ready.done(): ready.set_result(None)
+    self.loop.add_writer( self.fd, wake )
+    return ready
+
+  def close(self):
+    self.pause()
+    self.port.close()
+
+class Log_buffer(rtester.Logger):
+  # A Logger writing into memory, handed to the Tester so that
+  # checking never waits on the disk; the log task moves the
+  # text out to the real log file.
+  def __init__(self):
+    self.ready = True
+    self.fp = io.StringIO()
+  def take(self):
+    text = self.fp.getvalue()
+    self.fp.seek(0)
+    self.fp.truncate()
+    return text
+  def close(self):
+    pass
+
+class Async_tester:
+  # One run of the corpus through the four tasks. The Tester does
+  # the packet building, frame matching and checking, exactly as
+  # for the blocking run_window().
+  def __init__(self, port, tester, window=8, timeout=1.0, qsize=64):
+    self.port = port
+    self.tester = tester
+    self.window = window
+    self.timeout = timeout
+    self.inflight = {} # seq -> [ line, packet, size, nsent, tsent, echo, acknak ], oldest first
+    self.done = []     # seqs recently completed, to tell duplicates
+    self.sent = False
+    self.slots = asyncio.Semaphore(window)
+    self.checks = asyncio.Queue(qsize)
+    self.logs = asyncio.Queue(qsize)
+
+  async def transmit(self):
+    tester = self.tester
+    for i in range(len(tester.source)):
+      await self.slots.acquire()
+      seq = tester.next_seq()
+      pkt, size = tester.packet(i, seq)
+      # in flight before it is written, its echo may be quick
+      entry = [ i, pkt, size, 0, time.monotonic(), None, None ]
+      self.inflight[seq] = entry
+      entry[3] = await self.port.send(pkt)
+      tester.totals.all_accum( 1, size )
+      tester.progress(i)
+    self.sent = True
+
+  async def receive(self):
+    tester = self.tester
+    tester.last = -1
+    while not self.sent or self.inflight:
+      try:
+        frame = await asyncio.wait_for( self.port.recv(), 0.010 )
+      except asyncio.TimeoutError:
+        frame = None
+      if frame is not None:
+        seq = tester.take_frame( frame, self.inflight, self.done )
+        if seq is not None: await self.retire(seq)
+      now = time.monotonic()
+      while self.inflight:
+        seq = next(iter(self.inflight))
+        if now - self.inflight[seq][4] <= self.timeout: break
+        await self.retire(seq)
+    await self.checks.put(None)
+
+  async def retire(self, seq):
+    entry = self.tester.retire( seq, self.inflight, self.done, self.window )
+    self.slots.release()
+    await self.checks.put( (seq, entry) )
+
+  async def verify(self):
+    tester = self.tester
+    while True:
+      item = await self.checks.get()
+      if item is None: break
+      tester.check_entry( *item )
+      text = tester.logger.take()
+      if text: await self.logs.put(text)
+    await self.logs.put(None)
+
+  async def log(self, logger):
+    loop = asyncio.get_running_loop()
+    while True:
+      text = await self.logs.get()
+      if text is None: break
+      await loop.run_in_executor( None, write_log, logger, text )
+
+  async def run(self, logger):
+    await asyncio.gather( self.transmit(), self.receive(), self.verify(), self.log(logger) )
+
+def write_log(logger, text):
+  logger.fp.write(text)
+  logger.fp.flush()
+
+async def main(portname='/dev/ttyUSB0', window=8, codec='bytes', cksum=None):
+  c = rtester.Corpus()
+  port = Async_port(portname)
+
+  logger = rtester.Logger('logfile.txt')
+  if not logger:
+    print('error opening logfile')
+    exit(99)
+
+  tester = rtester.Tester(port, c, Log_buffer(), codec, cksum=cksum)
+  totals = tester.totals
+
+  for run in range(4):
+    logger.run_beg(f'Run # {run} framing {port.framing.NAME} window {window} async')
+    totals.run.reset()
+    tester.run = run
+
+    await Async_tester(port, tester, window).run(logger)
+
+    print(f'Run {run} Completed')
+    tester.summary()
+    write_log( logger, tester.logger.take() )
+    logger.run_end()
+    logger.fp.flush()
+
+  port.close()
+  logger.close()
+
+if __name__ == "__main__":
+  portname = '/dev/ttyUSB0'
+  window = 8
+  if len(sys.argv) > 1: portname = sys.argv[1]
+  if len(sys.argv) > 2: window = int(sys.argv[2])
+  asyncio.run( main(portname, window) )
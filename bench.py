@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for the upacket codec, run on the host
+# over lines of the test corpus.
+#   ./bench.py [nlines]
+# The suite times every codec step, over the corpus and over
+# synthetic payloads of fixed sizes, and can save the results as
+# a baseline to compare later runs against:
+#   ./bench.py --save                  write bench-baseline.json
+#   ./bench.py --compare [--threshold 10]
+# flags every case more than threshold percent slower than the
+# baseline, and exits 1 if there are any.
+
+import sys
+import time
+import json
+import random
+import argparse
+import platform
+import upacket
+
+def corpus_lines( fname='source.agc', nlines=None ):
+  lines = []
+  with open( fname, 'r' ) as fp:
+    for line in fp:
+      lines.append( line.rstrip() )
+      if nlines is not None and len(lines) >= nlines: break
+  return lines
+
+def best_time( func, items, repeat=5 ):
+  # best of several passes of func over all items, in seconds
+  best = None
+  for r in range(repeat):
+    t0 = time.perf_counter()
+    for item in items:
+      func(item)
+    t1 = time.perf_counter()
+    if best is None or t1-t0 < best: best = t1-t0
+  return best
+
+class Ascii_legacy(upacket.Ascii):
+  # the original per character implementations,
+  # kept as the reference to measure against
+  def pretty(self, text):
+    stext = []
+    for ch in text:
+      sym = self.codes[ord(ch)].sym
+      if len(sym) > 1:
+        stext.append( '{{{}}}'.format(sym) )
+      else:
+        stext.append( sym )
+    return ''.join(stext)
+  def serialize(self, text):
+    stext = []
+    for ch in text:
+      if self.visible(ch):
+        stext.append( ch )
+      else:
+        abbr = self.codes[ord(ch)].abbr
+        stext.append( '{{{}}}'.format(abbr) )
+    return ''.join(stext)
+  def unserialize(self, text):
+    for cc in self.CONTROLS:
+      abbr = '{{{}}}'.format( self.codes[cc].abbr )
+      text = text.replace(abbr, chr(cc))
+    return text
+
+def usec_per_item( func, items, repeat=7, mintime=0.02 ):
+  # best of several passes, each going over the items as many times
+  # as it takes mintime, so short cases are not lost in timer noise
+  best = None
+  for r in range(repeat):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+      for item in items:
+        func(item)
+      n += len(items)
+      t = time.perf_counter() - t0
+      if t >= mintime: break
+    if best is None or t/n < best: best = t/n
+  return 1e6 * best
+
+def report( name, items, told, tnew ):
+  n = len(items)
+  print(f'{name:20s} {1e6*told/n:10.3f} {1e6*tnew/n:10.3f} {told/tnew:8.1f}x')
+
+def bench_ascii( lines ):
+  legacy = Ascii_legacy()
+  fast = upacket.Ascii()
+  serialized = [ legacy.serialize(line) for line in lines ]
+  # both must agree before their times mean anything
+  for line, sline in zip(lines, serialized):
+    assert fast.pretty(line) == legacy.pretty(line)
+    assert fast.serialize(line) == sline
+    assert fast.unserialize(sline) == legacy.unserialize(sline)
+  print(f'Ascii, {len(lines)} corpus lines, usec/line')
+  print(f'{"":20s} {"legacy":>10s} {"fast":>10s} {"speedup":>9s}')
+  report( 'pretty', lines,
+          best_time(legacy.pretty, lines), best_time(fast.pretty, lines) )
+  report( 'serialize', lines,
+          best_time(legacy.serialize, lines), best_time(fast.serialize, lines) )
+  report( 'unserialize', serialized,
+          best_time(legacy.unserialize, serialized),
+          best_time(fast.unserialize, serialized) )
+
+def bench_checksums( lines ):
+  # cost per kilobyte of every registered engine; the *_py ones
+  # are the pure python code a MicroPython port falls back to
+  data = [ bytes(line, 'latin_1') for line in lines ]
+  kbytes = sum( [ len(d) for d in data ] ) / 1024.0
+  print(f'Checksums, {len(data)} corpus lines, {kbytes:.1f} KB')
+  print(f'{"":20s} {"code":>5s} {"usec/pkt":>10s} {"usec/KB":>10s} {"MB/sec":>10s}')
+  for name in sorted(upacket.CHECKSUMS):
+    engine = upacket.CHECKSUMS[name]
+    t = best_time( engine, data, repeat=3 )
+    print(f'{name:20s} {engine.code!r:>5s} {1e6*t/len(data):10.3f} '
+          f'{1e6*t/kbytes:10.1f} {kbytes/1024.0/t:10.2f}')
+
+def synthetic_lines( size, count, seed=1 ):
+  # printable text, tabs included, of exactly size characters
+  rng = random.Random(seed)
+  chars = '\t' + ''.join( [ chr(c) for c in range(32, 127) ] )
+  return [ ''.join( rng.choices(chars, k=size) ) for i in range(count) ]
+
+def suite_cases( lines ):
+  # (name, func, items) for every codec step over these lines
+  asc = upacket.Ascii.shared()
+  text = upacket.Framing_text
+  px = upacket.Packet()
+  pe = upacket.Packet()
+  pr = upacket.Packet()
+  po = upacket.Packet()
+  bx = upacket.Packet_bytes()
+  blines = [ bytes(line, 'latin_1') for line in lines ]
+  packets = [ upacket.Packet(line).packet for line in lines ]
+  bpackets = [ upacket.Packet_bytes(line).packet for line in blines ]
+  serialized = [ asc.serialize(line) for line in lines ]
+  sizes = [ len(line) for line in lines ]
+  hexes = [ upacket.Hex_value(size, size=4).hval for size in sizes ]
+  statuses = [ px.parse(packet) for packet in packets ]
+  # and some damaged ones, which fail part way through
+  statuses += [ px.parse(packet[:len(packet)//2]) for packet in packets[:len(packets)//4] ]
+  stexts = [ status.serialize() for status in statuses ]
+  ctexts = [ status.serialize_compact() for status in statuses ]
+  def round_trip( line ):
+    # as rtester and the Tarte-Py between them do for every line
+    px.generate( line )
+    pe.generate( text.wrap(px.packet), 'pkecho' )
+    pr.parse( pe.packet )
+    po.parse( text.unwrap(pr.payload) )
+  def status_unserialize( stext ):
+    upacket.Parsing_status().unserialize( stext )
+  return [
+    ( 'packet.generate',        px.generate,                        lines ),
+    ( 'packet.parse',           px.parse,                           packets ),
+    ( 'packet_bytes.generate',  bx.generate,                        blines ),
+    ( 'packet_bytes.parse',     bx.parse,                           bpackets ),
+    ( 'echo.round_trip',        round_trip,                         lines ),
+    ( 'ascii.pretty',           asc.pretty,                         lines ),
+    ( 'ascii.serialize',        asc.serialize,                      lines ),
+    ( 'ascii.unserialize',      asc.unserialize,                    serialized ),
+    ( 'hex_value.from_int',     lambda n: upacket.Hex_value(n, size=4), sizes ),
+    ( 'hex_value.from_string',  lambda h: upacket.Hex_value(h, size=4), hexes ),
+    ( 'status.serialize',       lambda st: st.serialize(),          statuses ),
+    ( 'status.unserialize',     status_unserialize,                 stexts ),
+    ( 'status.serialize_compact', lambda st: st.serialize_compact(), statuses ),
+    ( 'status.unserialize_compact', status_unserialize,             ctexts ),
+  ]
+
+def bench_suite( lines, sizes=(16, 256, 4096) ):
+  # usec per item of every case, keyed by data set and case
+  sets = [ ('corpus', lines) ]
+  for size in sizes:
+    # about the same number of bytes whatever the size
+    sets.append( ( f'synth{size}', synthetic_lines( size, max(20, 65536//size), seed=size ) ) )
+  results = {}
+  print(f'{"usec/item":32s} ' + ' '.join( [ f'{name:>10s}' for name, data in sets ] ))
+  table = {}
+  for sname, data in sets:
+    for cname, func, items in suite_cases(data):
+      usec = usec_per_item( func, items )
+      results[f'{sname}/{cname}'] = usec
+      table.setdefault( cname, [] ).append( usec )
+  for cname in table:
+    print(f'{cname:32s} ' + ' '.join( [ f'{usec:10.2f}' for usec in table[cname] ] ))
+  return results
+
+def save_baseline( fname, results, nlines ):
+  baseline = { 'python': platform.python_version(),
+               'machine': platform.machine(),
+               'nlines': nlines,
+               'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'results': results }
+  with open( fname, 'w' ) as fp:
+    json.dump( baseline, fp, indent=1, sort_keys=True )
+  print(f'baseline saved to {fname}')
+
+def compare_baseline( fname, results, threshold ):
+  # the cases slower than the baseline by more than threshold percent
+  with open( fname, 'r' ) as fp:
+    baseline = json.load( fp )
+  print(f'Against {fname}, python {baseline["python"]} on {baseline["machine"]}, {baseline["time"]}')
+  print(f'{"":40s} {"base":>10s} {"now":>10s} {"change":>8s}')
+  regressions = []
+  for name in sorted(results):
+    base = baseline['results'].get(name)
+    if base is None: continue
+    change = 100.0 * (results[name] - base) / base
+    flag = ''
+    if change > threshold:
+      flag = '  REGRESSION'
+      regressions.append(name)
+    print(f'{name:40s} {base:10.2f} {results[name]:10.2f} {change:+7.1f}%{flag}')
+  print(f'{len(regressions)} regressions over {threshold:.0f}%')
+  return regressions
+
+def main(argv):
+  parser = argparse.ArgumentParser( description='upacket codec benchmarks' )
+  parser.add_argument( 'nlines', type=int, nargs='?', default=10000 )
+  parser.add_argument( '--save', nargs='?', const='bench-baseline.json', default=None,
+                       help='save the suite results as a baseline' )
+  parser.add_argument( '--compare', nargs='?', const='bench-baseline.json', default=None,
+                       help='compare the suite results with a baseline' )
+  parser.add_argument( '--threshold', type=float, default=10.0,
+                       help='percent slower counted as a regression' )
+  args = parser.parse_args( argv[1:] )
+  lines = corpus_lines( nlines=args.nlines )
+  if args.save is None and args.compare is None:
+    bench_ascii( lines )
+    print()
+    bench_checksums( lines )
+    print()
+  results = bench_suite( lines )
+  if args.save is not None:
+    save_baseline( args.save, results, len(lines) )
+  if args.compare is not None:
+    print()
+    if compare_baseline( args.compare, results, args.threshold ): return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit( main(sys.argv) )
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Steps the link through a list of baud rates, the Tarte-Py being
+# told of each with a PKMODE packet, and runs the same slice of the
+# corpus at every one. Each step records the throughput reached,
+# its efficiency against ttsend() for the bytes on the wire, and
+# the error rate, as one line of a table collate.py can plot:
+#
+#   # baud sweep <label>
+#   #   baud  packets    bytes  seconds   pkts/s  bytes/s   eff%  errbytes      ppm
+#     115200     2000    50707    9.103    219.7   5570.4   71.2         0     0.00
+#
+# Label the table with the TraceR setting, e.g. r150, and sweep
+# again at each resistance to see where it starts to limit the baud.
+#   ./bsweep.py [label] [baud ...]
+
+import sys
+import rtester
+import tfinder
+
+BAUDS = ( 9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600 )
+
+class Step:
+  def __init__(self, baud, probe, window=0):
+    self.baud = baud
+    self.probe = probe
+    self.efficiency = 100.0 * probe.tideal(baud, window) / probe.elapsed
+  def __str__(self):
+    p = self.probe
+    return f'  {self.baud:7d} {p.npackets:8d} {p.all:8d} {p.elapsed:8.3f} ' \
+           f'{p.npackets/p.elapsed:8.1f} {p.all/p.elapsed:8.1f} {self.efficiency:6.1f} ' \
+           f'{p.err:9d} {p.ppm:8.2f}'
+
+def header(label):
+  return f'# baud sweep {label}\n' \
+         f'#   baud  packets    bytes  seconds   pkts/s  bytes/s   eff%  errbytes      ppm'
+
+class Sweep:
+  def __init__(self, tester, bauds=BAUDS, npackets=2000, delay=0.005, window=0):
+    self.tester = tester
+    self.bauds = bauds
+    self.npackets = npackets
+    self.delay = delay
+    self.window = window
+    self.steps = []
+
+  def run(self):
+    # every step sends the same lines, so only the baud differs
+    link = self.tester.link
+    finder = tfinder.Finder( self.tester, vb=False )
+    baud0 = link.port.baud
+    for baud in self.bauds:
+      if not link.set_baud(baud):
+        print(f'Tarte-Py did not switch to {baud} baud, stopping')
+        break
+      finder.beg = 0
+      step = Step( baud, finder.probe( self.npackets, self.delay, self.window ), self.window )
+      self.steps.append(step)
+      print(step)
+    if not link.set_baud(baud0):
+      print(f'Tarte-Py did not switch back to {baud0} baud')
+    return self.steps
+
+  def save(self, fname, label):
+    with open(fname, 'w') as fp:
+      print(header(label), file=fp)
+      for step in self.steps:
+        print(step, file=fp)
+
+def main(label='sweep', bauds=BAUDS, npackets=2000, window=0, codec='text', portname='/dev/ttyUSB0'):
+  c = rtester.Corpus()
+  p = rtester.Port(portname=portname)
+  link = rtester.Link(p)
+  logger = rtester.Logger('logfile.txt')
+  if not logger:
+    print('error opening logfile')
+    exit(99)
+  tester = rtester.Tester(link, c, logger, codec)
+  tester.verbose = False
+  sweep = Sweep(tester, bauds, npackets, window=window)
+  print(header(label))
+  sweep.run()
+  sweep.save(f'baud-{label}.txt', label)
+  logger.close()
+
+if __name__ == "__main__":
+  label = 'sweep'
+  bauds = BAUDS
+  if len(sys.argv) > 1: label = sys.argv[1]
+  if len(sys.argv) > 2: bauds = [ int(b) for b in sys.argv[2:] ]
+  main(label, bauds)
@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import datetime as dt
 import csv
+import json
 
 
 class Results:
@@ -39,6 +40,21 @@ class Results:
     #  packets and bytes per second
     self.packets_psec = self.tot_pkts / self.run_seconds
     self.bytes_psec = self.tot_bytes / self.run_seconds
+  def set_seconds(self, seconds):
+    # runtime as seconds, from a JSON lines log
+    hours, rest = divmod( seconds, 3600.0 )
+    minutes, seconds = divmod( rest, 60.0 )
+    self.set_runtime( f'{int(hours)}:{int(minutes):02d}:{seconds:09.6f}' )
+  def set_tally(self, tally):
+    # totals as recorded by rtester.Tally.as_dict()
+    self.tot_pkts = tally['pkts']
+    self.tot_bytes = tally['bytes']
+    self.err_pkts = tally['err_pkts']
+    self.err_bytes = tally['err_bytes']
+    if self.tot_bytes:
+      self.error100 = 100.0 * self.err_bytes / self.tot_bytes
+      self.error1e6 = 1.0e6 * self.err_bytes / self.tot_bytes
+    self.kinds = tally['kinds']
   def __str__(self):
     return f'\n'\
            f'File: {self.fname}, Run: {self.run}\n'\
@@ -107,6 +123,34 @@ class Logfile:
             self.cumul.set_runtime( fields[1] )
             self.runs.append(results)
 
+class Logfile_records(Logfile):
+  # The same results from a JSON lines log, rtester.Record_log,
+  # one json.loads() per line and no scanning of text. The error
+  # records are kept too, for looking into where errors fell.
+  def load(self, fname):
+    self.fname = fname
+    self.errors = []
+    self.cumul = Results( fname, 'cumulative' )
+    with open(fname, 'r') as fin:
+      for line in fin:
+        rec = json.loads(line)
+        event = rec['event']
+        if event == 'error':
+          self.errors.append(rec)
+        elif event == 'run_end':
+          results = Results( fname, str(rec['run']) )
+          results.set_tally( rec['totals'] )
+          results.set_seconds( rec['seconds'] )
+          self.cumul.set_tally( rec['cumul'] )
+          self.cumul.set_seconds( rec['seconds'] )
+          self.runs.append(results)
+
+def load_logfile(fname):
+  # a Logfile or Logfile_records, by the file name
+  log = Logfile_records() if fname.endswith('.jsonl') else Logfile()
+  log.load(fname)
+  return log
+
 class Logfile_ohms(Logfile):
   def __init__(self, ohms):
     self.ohms = ohms
@@ -242,6 +286,67 @@ class Serial_wiring_tests:
     ax.set_xlabel('Wiring Configuration')
     ax.set_ylabel('Error, PPM', c='b')
 
+class Baud_sweep:
+  # a table written by bsweep.py, one row per baud rate
+  def __init__(self, fname):
+    self.fname = fname
+    self.label = fname
+    rows = []
+    with open(fname, 'r') as fin:
+      for line in fin:
+        fields = line.split()
+        if len(fields) == 0: continue
+        if fields[0] == '#':
+          if fields[1:3] == ['baud', 'sweep']: self.label = ' '.join(fields[3:])
+          continue
+        rows.append( [ float(f) for f in fields ] )
+    table = np.array(rows).reshape(-1, 9)
+    self.baud = table[:,0]
+    self.pkts_psec = table[:,4]
+    self.bytes_psec = table[:,5]
+    self.efficiency = table[:,6]
+    self.error1e6 = table[:,8]
+
+class Serial_baud_tests:
+  def __init__(self, fnames):
+    self.sweeps = [ Baud_sweep(fname) for fname in fnames ]
+
+  def plot_sweeps( self, ax ):
+    # efficiency solid on the left axis, error ppm dashed on the right
+    ax2 = ax.twinx()
+    for sweep in self.sweeps:
+      line, = ax.plot(sweep.baud, sweep.efficiency, '-o', label=sweep.label )
+      ax2.plot(sweep.baud, sweep.error1e6, '--x', c=line.get_color() )
+    ax.set_title('Link Efficiency and Errors vs Baud Rate')
+    ax.set_xscale('log')
+    ax.set_xticks(self.sweeps[0].baud)
+    ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, pos: f'{x/1000:g}k'))
+    ax.xaxis.set_minor_formatter(ticker.NullFormatter())
+    ax.set_ylim(0,105)
+    ax.grid(which='major', alpha=0.5)
+    ax.set_xlabel('Baud Rate')
+    ax.set_ylabel('Efficiency vs ttsend, %')
+    ax2.set_ylabel('Error, PPM (dashed)')
+    ax.legend()
+
+def main_baud(fnames):
+  st = Serial_baud_tests(fnames)
+
+  nprows=1
+  npcols=1
+  vsize = 6
+  hsize = 10
+  fig, ax = plt.subplots(nrows=nprows, ncols=npcols, figsize=(hsize,vsize))
+  title = 'Serial Link Baud Rate Sweep'
+  fig.canvas.manager.set_window_title('serial-link-test')
+  fig.suptitle(title, fontsize=20, fontweight='bold')
+
+  st.plot_sweeps( ax )
+
+  plt.show()
+  fig.savefig('collate_baud_sweep.pdf')
+  fig.savefig('collate_baud_sweep.png')
+
 def main_ohms():
   st = SerialTests()
 
@@ -289,7 +394,8 @@ def main_wires():
 
 if __name__ == "__main__":
   #main_ohms()
-  main_wires()
+  if len(sys.argv) > 1: main_baud(sys.argv[1:])
+  else: main_wires()
 
 
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Live metrics for long rtester runs. A Metrics registry is fed by
+# the Totals as packets go out and errors come in, and keeps running
+# counts plus rolling rates over the last window seconds. It can be
+# watched in two ways:
+#   serve(port)        http://localhost:port/metrics in the
+#                      Prometheus text format
+#   snapshots(fname)   the same as JSON, rewritten every few seconds
+# e.g. rtester.main( metrics_port=9100 ), then
+#   curl -s localhost:9100/metrics
+#   watch cat metrics.json
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import mismatch
+
+class Metrics:
+  def __init__(self, window=60.0):
+    self.window = window
+    self.lock = threading.Lock()
+    self.tstart = time.monotonic()
+    self.pkts = 0
+    self.bytes = 0
+    self.err_pkts = 0
+    self.err_bytes = 0
+    self.kinds = { kind: 0 for kind in mismatch.KINDS }
+    self.ooo = 0
+    self.dup = 0
+    self.run = 0
+    self.line = 0
+    # one bucket per second: [ second, pkts, bytes, err_pkts, err_bytes ]
+    self.buckets = deque()
+    self.server = None
+    self.snapper = None
+
+  def bucket(self):
+    now = int( time.monotonic() )
+    if not self.buckets or self.buckets[-1][0] != now:
+      self.buckets.append( [ now, 0, 0, 0, 0 ] )
+      while self.buckets[0][0] <= now - self.window:
+        self.buckets.popleft()
+    return self.buckets[-1]
+
+  def sent(self, pkts, _bytes):
+    with self.lock:
+      self.pkts += pkts
+      self.bytes += _bytes
+      b = self.bucket()
+      b[1] += pkts
+      b[2] += _bytes
+
+  def error(self, kind, pkts, _bytes):
+    with self.lock:
+      self.err_pkts += pkts
+      self.err_bytes += _bytes
+      self.kinds[kind] += pkts
+      b = self.bucket()
+      b[3] += pkts
+      b[4] += _bytes
+
+  def out_of_order(self, pkts):
+    with self.lock:
+      self.ooo += pkts
+
+  def duplicate(self, pkts):
+    with self.lock:
+      self.dup += pkts
+
+  def position(self, run, line):
+    self.run = run
+    self.line = line
+
+  def rates(self):
+    # packets/s, bytes/s and error ppm over the rolling window
+    with self.lock:
+      now = time.monotonic()
+      horizon = int(now) - self.window
+      buckets = [ b for b in self.buckets if b[0] > horizon ]
+      span = min( self.window, now - self.tstart )
+    if span <= 0.0: return 0.0, 0.0, 0.0
+    pkts = sum( [ b[1] for b in buckets ] )
+    nbytes = sum( [ b[2] for b in buckets ] )
+    err_bytes = sum( [ b[4] for b in buckets ] )
+    ppm = 1.0e6 * err_bytes / nbytes if nbytes else 0.0
+    return pkts / span, nbytes / span, ppm
+
+  def as_dict(self):
+    pkts_psec, bytes_psec, ppm = self.rates()
+    with self.lock:
+      return { 'run': self.run, 'line': self.line,
+               'pkts': self.pkts, 'bytes': self.bytes,
+               'err_pkts': self.err_pkts, 'err_bytes': self.err_bytes,
+               'kinds': dict(self.kinds), 'ooo': self.ooo, 'dup': self.dup,
+               'window': self.window, 'pkts_psec': pkts_psec,
+               'bytes_psec': bytes_psec, 'ppm': ppm,
+               'uptime': time.monotonic() - self.tstart }
+
+  def prometheus(self):
+    d = self.as_dict()
+    lines = []
+    def metric(name, mtype, help, value, kinds=None):
+      lines.append(f'# HELP rtester_{name} {help}')
+      lines.append(f'# TYPE rtester_{name} {mtype}')
+      if kinds is None:
+        lines.append(f'rtester_{name} {value}')
+        return
+      for kind in kinds:
+        lines.append(f'rtester_{name}{{kind="{kind}"}} {value[kind]}')
+    metric( 'packets_total', 'counter', 'Packets sent.', d['pkts'] )
+    metric( 'bytes_total', 'counter', 'Payload bytes sent.', d['bytes'] )
+    metric( 'error_packets_total', 'counter', 'Packets with errors, by kind.', d['kinds'], mismatch.KINDS )
+    metric( 'error_bytes_total', 'counter', 'Payload bytes of packets with errors.', d['err_bytes'] )
+    metric( 'out_of_order_total', 'counter', 'Echoes received out of order.', d['ooo'] )
+    metric( 'duplicates_total', 'counter', 'Echoes received twice.', d['dup'] )
+    metric( 'packets_per_second', 'gauge', f'Packets/s over the last {self.window:g} s.', f'{d["pkts_psec"]:.3f}' )
+    metric( 'bytes_per_second', 'gauge', f'Payload bytes/s over the last {self.window:g} s.', f'{d["bytes_psec"]:.3f}' )
+    metric( 'error_ppm', 'gauge', f'Error bytes ppm over the last {self.window:g} s.', f'{d["ppm"]:.3f}' )
+    metric( 'run', 'gauge', 'Run in progress.', d['run'] )
+    metric( 'line', 'gauge', 'Corpus line being sent.', d['line'] )
+    return '\n'.join(lines) + '\n'
+
+  def serve(self, port=9100, host='127.0.0.1'):
+    # the Prometheus endpoint, from a daemon thread
+    metrics = self
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        if self.path not in ( '/', '/metrics' ):
+          self.send_error(404)
+          return
+        body = metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header( 'Content-Type', 'text/plain; version=0.0.4' )
+        self.send_header( 'Content-Length', str(len(body)) )
+        self.end_headers()
+        self.wfile.write(body)
+      def log_message(self, format, *args):
+        pass
+    self.server = ThreadingHTTPServer( (host, port), Handler )
+    threading.Thread( target=self.server.serve_forever, daemon=True ).start()
+    return self.server
+
+  def snapshot(self, fname):
+    # written aside and renamed, a reader never sees half of it
+    tmpname = fname + '.tmp'
+    with open( tmpname, 'w' ) as fp:
+      json.dump( self.as_dict(), fp, indent=1 )
+    os.replace( tmpname, fname )
+
+  def snapshots(self, fname='metrics.json', interval=5.0):
+    # rewrites the snapshot file every interval seconds until stop()
+    self.stopping = threading.Event()
+    def loop():
+      while not self.stopping.wait(interval):
+        self.snapshot(fname)
+      self.snapshot(fname)
+    self.snapper = threading.Thread( target=loop, daemon=True )
+    self.snapper.start()
+
+  def stop(self):
+    if self.server is not None:
+      self.server.shutdown()
+      self.server.server_close()
+    if self.snapper is not None:
+      self.stopping.set()
+      self.snapper.join()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Classify how a received frame differs from the one expected,
+# in linear time, by the shape of the damage:
+#   framing      frames missing, merged or extra
+#   truncation   received is a prefix of expected, tail lost
+#   gap          a run of bytes dropped from the middle
+#   insertion    a run of extra bytes in the middle
+#   bitflip      same length, bytes changed in place
+#   other        anything else, e.g. a gap and changes together
+
+KINDS = ( 'framing', 'truncation', 'gap', 'insertion', 'bitflip', 'other' )
+
+class Mismatch:
+  def __init__(self, kind, pos=0, length=0, nbits=0):
+    self.kind = kind
+    self.pos = pos       # offset of the damage in the expected frame
+    self.length = length # bytes dropped, inserted or changed
+    self.nbits = nbits   # bits flipped, for bitflip
+  def __str__(self):
+    if self.kind == 'framing':
+      return self.kind
+    if self.kind == 'bitflip':
+      return f'{self.kind} at {self.pos}, {self.length} bytes, {self.nbits} bits'
+    return f'{self.kind} at {self.pos}, {self.length} bytes'
+  def __repr__(self):
+    return self.__str__()
+
+def as_bytes(data):
+  if isinstance(data, str): return bytes(data, 'latin_1')
+  return bytes(data)
+
+BLOCK = 64
+
+def common_prefix(a, b, limit):
+  # length of the common prefix, compared a block at a time
+  # and byte by byte only inside the first differing block
+  i = 0
+  while i + BLOCK <= limit and a[i:i+BLOCK] == b[i:i+BLOCK]:
+    i += BLOCK
+  while i < limit and a[i] == b[i]:
+    i += 1
+  return i
+
+def common_suffix(a, b, limit):
+  na = len(a)
+  nb = len(b)
+  i = 0
+  while i + BLOCK <= limit and a[na-i-BLOCK:na-i] == b[nb-i-BLOCK:nb-i]:
+    i += BLOCK
+  while i < limit and a[na-i-1] == b[nb-i-1]:
+    i += 1
+  return i
+
+def popcount(x):
+  return bin(x).count('1')
+
+def classify(expected, received):
+  # None if they are the same
+  if received is None: return Mismatch('framing')
+  a = as_bytes(expected)
+  b = as_bytes(received)
+  if a == b: return None
+  na = len(a)
+  nb = len(b)
+  nmin = min(na, nb)
+  pre = common_prefix(a, b, nmin)
+  suf = common_suffix(a, b, nmin - pre)
+  if na == nb:
+    nbits = 0
+    nbytes = 0
+    for i in range(pre, na-suf):
+      x = a[i] ^ b[i]
+      if x:
+        nbytes += 1
+        nbits += popcount(x)
+    return Mismatch('bitflip', pre, nbytes, nbits)
+  if nb < na:
+    if pre == nb: return Mismatch('truncation', nb, na-nb)
+    if pre + suf >= nb: return Mismatch('gap', pre, na-nb)
+    return Mismatch('other', pre, na-nb)
+  if pre + suf >= na: return Mismatch('insertion', pre, nb-na)
+  return Mismatch('other', pre, nb-na)
+
+def span(expected, received):
+  # (beg, end) of the bytes of expected that are damaged in
+  # received, None if they are the same; damage past the end
+  # of expected is put on its last byte
+  a = as_bytes(expected)
+  b = as_bytes(received)
+  if a == b: return None
+  nmin = min(len(a), len(b))
+  pre = common_prefix(a, b, nmin)
+  suf = common_suffix(a, b, nmin - pre)
+  beg = min( pre, max( len(a)-1, 0 ) )
+  return beg, max( len(a) - suf, beg+1 )
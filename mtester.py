@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Runs rtester on several Tarte-Py boards at once, one worker
+# thread per serial port. Each worker has its own Tester, so its
+# own position in the corpus, totals and log file, logfile-ttyUSB0.txt
+# and so on. The main thread shows the per port and merged totals
+# while they run.
+#   ./mtester.py [--window N] port [port ...]
+
+import sys
+import os
+import time
+import threading
+import rtester
+
+class Worker(threading.Thread):
+  def __init__(self, portname, corpus, codec='text', framings=('text',), window=0, cksum=None):
+    super().__init__( name=os.path.basename(portname), daemon=True )
+    self.portname = portname
+    self.corpus = corpus
+    self.codec = codec
+    self.framings = framings
+    self.window = window
+    self.cksum = cksum
+    self.tester = None
+    self.error = None
+    self.logname = f'logfile-{self.name}.txt'
+
+  def run(self):
+    try:
+      link = rtester.Link( rtester.Port(portname=self.portname) )
+      logger = rtester.Logger(self.logname)
+      self.tester = rtester.Tester( link, self.corpus, logger, self.codec, cksum=self.cksum )
+      self.tester.verbose = False
+      self.tester.run_all( self.framings, self.window )
+      logger.close()
+    except Exception as e:
+      self.error = e
+
+def ppm(tally):
+  if tally.all.bytes == 0: return 0.0
+  return 1.0e6 * tally.err.bytes / tally.all.bytes
+
+def view(workers, nlines):
+  # one line per port and one for all of them, from the whole program
+  total = rtester.Totals()
+  lines = [ f'{"port":12s} {"run":>3s} {"line":>7s} {"done":>5s} '
+            f'{"packets":>10s} {"bytes":>12s} {"errors":>8s} {"ppm":>10s}' ]
+  for w in workers:
+    t = w.tester
+    if t is None:
+      status = 'failed: ' + str(w.error) if w.error else 'starting'
+      lines.append( f'{w.name:12s} {status}' )
+      continue
+    total.merge( t.totals )
+    prg = t.totals.prg
+    state = '' if w.is_alive() else ('  failed: ' + str(w.error) if w.error else '  done')
+    lines.append( f'{w.name:12s} {t.run:3d} {t.cursor:7d} {100.0*t.cursor/nlines:4.0f}% '
+                  f'{prg.all.pkts:10d} {prg.all.bytes:12d} {prg.err.pkts:8d} {ppm(prg):10.2f}{state}' )
+  prg = total.prg
+  lines.append( f'{"all":12s} {"":3s} {"":7s} {"":5s} '
+                f'{prg.all.pkts:10d} {prg.all.bytes:12d} {prg.err.pkts:8d} {ppm(prg):10.2f}' )
+  return '\n'.join(lines)
+
+def main(portnames, codec='text', framings=('text',), window=0, cksum=None, refresh=1.0):
+  if 'cobs' in framings:
+    codec = 'bytes'
+  c = rtester.Corpus()
+  workers = [ Worker(name, c, codec, framings, window, cksum) for name in portnames ]
+  for w in workers:
+    w.start()
+  while any( [ w.is_alive() for w in workers ] ):
+    time.sleep(refresh)
+    # home the cursor and redraw in place
+    print('\x1b[H\x1b[J' + view(workers, c.nlines), flush=True)
+  print(view(workers, c.nlines))
+  return all( [ w.error is None for w in workers ] )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  window = 0
+  if len(args) > 1 and args[0] == '--window':
+    window = int(args[1])
+    args = args[2:]
+  if not args:
+    print('usage: mtester.py [--window N] port [port ...]')
+    exit(2)
+  if not main(args, window=window): exit(1)
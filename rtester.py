@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 
 import sys, signal
+import os
 import serial
 import time
 import binascii
 import string
+import hashlib
+import struct
+from array import array
+import mmap
+import numpy as np
 import datetime as dt
+import json
+import queue
+import threading
 import upacket
+import mismatch
+import metrics
 
 def ttsend( size, baud ):
   tbit = 1.0 / baud
@@ -14,62 +25,409 @@ def ttsend( size, baud ):
   return size * tbyte
 
 class Corpus:
-  def __init__( self, fname='source.agc' ):
-    self.source = []
+  # The corpus file memory mapped, never read into memory as a whole,
+  # with a NumPy index of where each line starts and how long it is
+  # with trailing whitespace stripped. The index is built a chunk
+  # at a time with vectorized byte operations, and cached next to
+  # the corpus (source.agc.idx.npz) keyed by its size and mtime,
+  # so later startups only load it.
+  #   source   the lines as str, decoded when asked for
+  #   bsource  the same lines as bytes
+  CHUNK = 1 << 24
+  # what str.rstrip() strips from a latin_1 line
+  WHITESPACE = np.frombuffer( b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f\x85\xa0', dtype=np.uint8 )
+  def __init__( self, fname='source.agc', verbose=True ):
     self.fname = fname
-    fp = open( self.fname, 'r' )
-    if fp is None:
-      print('Error opening file:', e)
-      return
-    # count the lines,
-    # find maximum length
-    self.maxlen = 0
-    self.nlines = 0
-    self.nbytes = 0
+    self.fp = open( self.fname, 'rb' )
+    st = os.fstat( self.fp.fileno() )
+    self.key = np.array( [ st.st_size, st.st_mtime_ns ], dtype=np.int64 )
+    if st.st_size: self.map = mmap.mmap( self.fp.fileno(), 0, access=mmap.ACCESS_READ )
+    else: self.map = b''
+    self.data = np.frombuffer( self.map, dtype=np.uint8 )
+    self.iname = fname + '.idx.npz'
+    if not self.load():
+      self.build()
+      self.save()
+    self.source = Corpus_lines( self )
+    self.bsource = Corpus_lines( self, as_bytes=True )
+    # line lengths as read, newline included
+    self.rawlens = np.diff( np.append( self.offsets, len(self.data) ) )
+    self.nlines = len(self.offsets)
+    self.nbytes = len(self.data)
+    self.maxlen = int( self.rawlens.max() ) if self.nlines else 0
+    if verbose:
+      print('nbytes:', self.nbytes)
+      print('nlines:', self.nlines)
+      print('maxlen:', self.maxlen)
+      print('ttsend:', ttsend(self.nbytes, 115200))
+      print('n8bits:', self.n8bits)
+
+  def build(self):
+    # each chunk is cut after a newline, so no line straddles two
+    offsets = []
+    lengths = []
     self.n8bits = 0
-    for line in fp:
-      self.source.append( line.rstrip() )
-      lenline = len(line)
-      self.nbytes += lenline
-      self.nlines += 1
-      if lenline > self.maxlen: self.maxlen = lenline
-      ##  for ch in line:
-      ##    val = ch.encode('latin_1')
-      ##    val = int.from_bytes( val, 'little' )
-      ##    if val & 0x80: self.n8bits += 1
-    print('nbytes:', self.nbytes)
-    print('nlines:', self.nlines)
-    print('maxlen:', self.maxlen)
-    print('ttsend:', ttsend(self.nbytes, 115200))
-    print('n8bits:', self.n8bits)
-    fp.close()
+    ws = np.zeros( 256, dtype=bool )
+    ws[self.WHITESPACE] = True
+    beg = 0
+    size = len(self.data)
+    while beg < size:
+      end = min( beg + self.CHUNK, size )
+      if end < size:
+        nl = self.map.find( b'\n', end-1 )
+        end = size if nl < 0 else nl+1
+      chunk = self.data[beg:end]
+      ends = np.flatnonzero( chunk == 0x0a ) + 1
+      if len(ends) == 0 or ends[-1] != len(chunk):
+        ends = np.append( ends, len(chunk) )
+      starts = np.concatenate( ( [0], ends[:-1] ) )
+      # the last byte of each line that is not whitespace, if any
+      solid = np.flatnonzero( ~ws[chunk] )
+      k = np.searchsorted( solid, ends ) - 1
+      last = np.where( k >= 0, solid[np.maximum(k, 0)] if len(solid) else -1, -1 )
+      lens = np.where( last >= starts, last + 1 - starts, 0 )
+      offsets.append( starts + beg )
+      lengths.append( lens )
+      self.n8bits += int( np.count_nonzero( chunk & 0x80 ) )
+      beg = end
+    if offsets:
+      self.offsets = np.concatenate( offsets ).astype( np.int64 )
+      self.lengths = np.concatenate( lengths ).astype( np.uint32 )
+    else:
+      self.offsets = np.zeros( 0, dtype=np.int64 )
+      self.lengths = np.zeros( 0, dtype=np.uint32 )
+
+  def load(self):
+    if not os.path.exists(self.iname): return False
+    try:
+      with np.load( self.iname ) as npz:
+        if not np.array_equal( npz['key'], self.key ): return False
+        self.offsets = npz['offsets']
+        self.lengths = npz['lengths']
+        self.n8bits = int( npz['n8bits'] )
+    except (OSError, KeyError, ValueError):
+      return False
+    return True
+
+  def save(self):
+    # written aside and renamed, as Corpus_cache.save()
+    tmpname = self.iname + '.tmp'
+    try:
+      with open( tmpname, 'wb' ) as fp:
+        np.savez( fp, key=self.key, offsets=self.offsets,
+                  lengths=self.lengths, n8bits=self.n8bits )
+      os.replace( tmpname, self.iname )
+    except OSError as e:
+      print('corpus index not saved:', e)
+
+  def histogram(self, bins=16):
+    # counts of line lengths, newline included, and the bin edges
+    return np.histogram( self.rawlens, bins=bins )
+
+  def digest(self):
+    return hashlib.sha256( self.map ).digest()
+
+class Corpus_lines:
+  # The corpus lines as a read-only sequence, each sliced
+  # out of the map and decoded only when asked for.
+  def __init__( self, corpus, as_bytes=False ):
+    self.corpus = corpus
+    self.as_bytes = as_bytes
+  def __len__(self):
+    return len(self.corpus.offsets)
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [ self[j] for j in range(*i.indices(len(self))) ]
+    offset = int( self.corpus.offsets[i] )
+    line = self.corpus.map[offset:offset+int(self.corpus.lengths[i])]
+    if self.as_bytes: return line
+    return line.decode('latin_1')
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+class Batches:
+  # Consecutive lines of a source packed into payloads of at most
+  # limit bytes, joined by SEP, for bulk transfer rather than
+  # header bound tests; a line longer than limit goes alone.
+  # Served as a sequence of payloads like the source, and able
+  # to tell which lines a damaged stretch of a payload held.
+  SEP = b'\n'
+  # largest payload whose packet, escaped into the echo with its
+  # sync extensions, still fits the 16 bit SIZE field of the echo
+  MAX = 0xffff - 2*upacket.Packet_bytes.OVERHEAD
+  def __init__( self, source, lengths, limit ):
+    if not 0 < limit <= self.MAX:
+      raise ValueError(f'batch limit {limit} outside 1..{self.MAX}')
+    self.source = source
+    self.limit = limit
+    self.sep = self.SEP if source.as_bytes else self.SEP.decode('latin_1')
+    self.lengths = np.asarray( lengths, dtype=np.int64 )
+    # end of each line and its separator from the first line
+    self.ends = np.cumsum( self.lengths + 1 )
+    bounds = [0]
+    n = len(self.lengths)
+    while bounds[-1] < n:
+      beg = bounds[-1]
+      base = int(self.ends[beg-1]) if beg else 0
+      # the separator after the last line is not sent
+      end = int( np.searchsorted( self.ends, base + limit + 1, 'right' ) )
+      bounds.append( max( end, beg+1 ) )
+    self.bounds = np.array( bounds, dtype=np.int64 )
+  def __len__(self):
+    return len(self.bounds) - 1
+  def __getitem__(self, k):
+    return self.sep.join( self.source[int(self.bounds[k]):int(self.bounds[k+1])] )
+  def lines( self, k, span=None ):
+    # first and last+1 line of payload k overlapping its bytes
+    # span[0]:span[1], all of them if None, and the bytes of those
+    # lines with their separators
+    first, last = int(self.bounds[k]), int(self.bounds[k+1])
+    base = int(self.ends[first-1]) if first else 0
+    ends = self.ends[first:last] - base
+    starts = ends - self.lengths[first:last] - 1
+    size = int(ends[-1]) - 1
+    j0, j1 = 0, last - first
+    if span is not None:
+      j0 = int( np.searchsorted( ends, span[0], 'right' ) )
+      j1 = int( np.searchsorted( starts, span[1], 'left' ) )
+    return first + j0, first + j1, min( int(ends[j1-1]), size ) - int(starts[j0])
+
+
+class Corpus_cache:
+  # Every corpus line pre-encoded as a PKSEND packet into one
+  # contiguous buffer, with an (offset, length) index into it.
+  # It is saved next to the corpus (source.agc.pkc) and keyed by
+  # the sha256 of the corpus file, so later runs only load it
+  # and send slices of the buffer.
+  # File layout:
+  #   magic, digest, number of packets,
+  #   index as array('I') of offset,length pairs, packet buffer
+  # Packets using another checksum than crc32 are cached in their
+  # own file, source.agc.crc16.pkc, its name part of the key.
+  MAGIC = b'PKC1'
+  HEADER = '<4s32sI'
+  def __init__( self, corpus, fname=None, cksum=None ):
+    self.corpus = corpus
+    if cksum is None: cksum = upacket.CHECKSUM_DEF
+    self.cksum = cksum
+    if fname is None:
+      if cksum == upacket.CHECKSUM_DEF: fname = corpus.fname + '.pkc'
+      else: fname = corpus.fname + '.' + cksum + '.pkc'
+    self.fname = fname
+    self.digest = hashlib.sha256( corpus.digest() + bytes(cksum, 'latin_1') ).digest()
+    # packet length less payload, the same for every packet
+    self.overhead = len( upacket.Packet_bytes(b'', cksum=cksum).packet )
+    if not self.load():
+      self.build()
+      self.save()
+    self.view = memoryview(self.buff)
+    print('pkcache:', self.fname, len(self), 'packets', len(self.buff), 'bytes')
+
+  def __len__(self):
+    return len(self.index) // 2
+
+  def packet(self, i):
+    offset = self.index[2*i]
+    return self.view[offset:offset+self.index[2*i+1]]
+
+  def size(self, i):
+    # payload size of packet i
+    return self.index[2*i+1] - self.overhead
+
+  def build(self):
+    px = upacket.Packet_bytes()
+    self.buff = bytearray()
+    self.index = array('I')
+    for line in self.corpus.source:
+      px.generate( bytes(line, 'latin_1'), cksum=self.cksum )
+      self.index.append( len(self.buff) )
+      self.index.append( len(px.packet) )
+      self.buff += px.packet
+
+  def load(self):
+    if not os.path.exists(self.fname): return False
+    with open( self.fname, 'rb' ) as fp:
+      header = fp.read( struct.calcsize(self.HEADER) )
+      if len(header) != struct.calcsize(self.HEADER): return False
+      magic, digest, npackets = struct.unpack( self.HEADER, header )
+      if magic != self.MAGIC or digest != self.digest: return False
+      self.index = array('I')
+      try:
+        self.index.fromfile( fp, 2*npackets )
+      except EOFError:
+        return False
+      self.buff = bytearray( fp.read() )
+    return True
+
+  def save(self):
+    # written aside and renamed, so a crash never leaves
+    # a half written cache behind
+    tmpname = self.fname + '.tmp'
+    with open( tmpname, 'wb' ) as fp:
+      fp.write( struct.pack( self.HEADER, self.MAGIC, self.digest, len(self) ) )
+      self.index.tofile( fp )
+      fp.write( self.buff )
+    os.replace( tmpname, self.fname )
 
 
 class Port:
-  def __init__(self, portname='/dev/serial0', baud=115200):
+  # A reply is waited for at most deadline() of the bytes expected,
+  # and once it has started, no longer than gap() between bytes.
+  # turnaround is the time allowed for the Tarte-Py to answer, on top
+  # of the wire time; the default covers a MicroPython GC pause, and
+  # after a bad reply the line must be quiet that long to be in step.
+  GAP_BYTES = 32      # inter-byte timeout in byte times at the baud,
+  GAP_MIN = 0.025     # no less than a USB adapter's latency timer
+  TURNAROUND = 0.250
+  def __init__(self, portname='/dev/serial0', baud=115200, turnaround=TURNAROUND):
     self.portname = portname
     self.baud = baud
+    self.turnaround = turnaround
     self.timeout = 0.5
     self.port = serial.Serial(
           self.portname, 
           baudrate = self.baud,
           timeout = self.timeout
         )
+    self.read_timeout = self.timeout # as last set on the serial port
     print(self.port.name)
     self.port.reset_input_buffer()
     self.port.reset_output_buffer()
 
   def send( self, message ):
-    return self.port.write( bytes(message, 'latin_1') )
+    # str messages are encoded, bytes-like ones go out as they are
+    if isinstance(message, str):
+      message = bytes(message, 'latin_1')
+    return self.port.write( message )
+
+  def set_timeout( self, timeout ):
+    self.timeout = timeout
+    self.set_read_timeout( timeout )
+
+  def set_read_timeout( self, timeout ):
+    # pyserial reconfigures the port on every change, so only if it is one
+    if timeout == self.read_timeout: return
+    self.read_timeout = timeout
+    self.port.timeout = timeout
+
+  def set_baud( self, baud ):
+    # pyserial reconfigures an open port in place
+    self.baud = baud
+    self.port.baudrate = baud
+
+  def deadline( self, nbytes ):
+    # seconds to allow for nbytes to cross the wire, twice the
+    # ideal plus the turnaround
+    return 2.0 * ttsend( nbytes, self.baud ) + self.turnaround
+
+  def gap( self ):
+    return max( ttsend( self.GAP_BYTES, self.baud ), self.GAP_MIN )
 
   def recv( self, size ):
+    self.set_read_timeout( self.timeout )
     buff = self.port.read( size )
     return buff.decode('latin_1')
 
+  def recv_frames( self, decoder, nframes, deadline=None ):
+    # Read until the decoder has completed nframes frames,
+    # returning as soon as they are in rather than waiting out
+    # the timeout. All must be in within deadline seconds, the
+    # port timeout if None, and once bytes are coming a silence
+    # longer than gap() ends the reply too. Whatever partial
+    # frame is left then is flushed out as a last (bad) frame.
+    frames = []
+    tend = time.monotonic() + ( self.timeout if deadline is None else deadline )
+    gap = self.gap()
+    started = False
+    while len(frames) < nframes:
+      left = tend - time.monotonic()
+      if left <= 0.0: break
+      self.set_read_timeout( min( left, gap ) if started else left )
+      buff = self.port.read( 1 )
+      if len(buff) == 0: break
+      started = True
+      waiting = self.port.in_waiting
+      if waiting: buff += self.port.read( waiting )
+      frames.extend( decoder.feed(buff) )
+    if len(frames) < nframes:
+      rest = decoder.flush()
+      if rest is not None: frames.append(rest)
+    return frames
+
+  def drain( self, quiet ):
+    # discards whatever arrives until the line has been quiet for
+    # quiet seconds: late or leftover replies that would otherwise
+    # be taken for those of the next packet
+    self.set_read_timeout( quiet )
+    while len( self.port.read( max( self.port.in_waiting, 1 ) ) ): pass
+
+  def poll_frames( self, decoder ):
+    # whatever frames complete within one read timeout,
+    # without waiting for any number of them
+    self.set_read_timeout( self.timeout )
+    buff = self.port.read( 1 )
+    if len(buff) == 0: return []
+    waiting = self.port.in_waiting
+    if waiting: buff += self.port.read( waiting )
+    return decoder.feed(buff)
+
+class Link:
+  # A Port plus the framing currently agreed with the Tarte-Py.
+  # Settings are changed with a PKMODE packet, which is sent and
+  # answered in the old settings; the new ones apply after it.
+  def __init__(self, port, framing='text'):
+    self.port = port
+    self.use_framing( framing )
+  def use_framing(self, name):
+    self.framing = upacket.FRAMINGS[name]
+    self.decoder = self.framing.decoder()
+  def send(self, packet):
+    return self.port.send( self.framing.frame(packet) )
+  def recv(self, nframes, nsent=None):
+    # nsent, the bytes of the packet just sent, bounds the wait by
+    # how long it and the reply to it take on the wire, rather than
+    # the port timeout
+    deadline = None
+    if nsent is not None: deadline = self.port.deadline( nsent + self.reply_size(nsent) )
+    return self.port.recv_frames( self.decoder, nframes, deadline )
+  def reply_size(self, nsent):
+    # bytes expected back for nsent sent: the packet wrapped in an
+    # echo, plus an ack/nak, all with framing to spare
+    return nsent + nsent//254 + 3*upacket.Packet_bytes.OVERHEAD + 32
+  def poll(self):
+    return self.port.poll_frames( self.decoder )
+  def drain(self, quiet=None):
+    # back in step after a bad reply, nothing stale left to read;
+    # quiet is the port turnaround if None
+    self.port.drain( self.port.turnaround if quiet is None else quiet )
+    self.decoder.reset()
+  def set_mode(self, settings):
+    # True if the Tarte-Py acknowledged the settings
+    pm = upacket.Packet_bytes( bytes(upacket.mode_encode(settings), 'latin_1'), 'pkmode' )
+    self.send( pm.packet )
+    frames = self.recv( 2 )
+    if len(frames) != 2: return False
+    pa = upacket.Packet_bytes()
+    if not pa.parse( frames[1] ): return False
+    status = upacket.Parsing_status()
+    return status.unserialize( bytes(pa.payload).decode('latin_1') ) and bool(status)
+  def set_baud(self, baud):
+    if baud == self.port.baud: return True
+    if not self.set_mode( { 'baud': baud } ): return False
+    self.port.set_baud( baud )
+    self.decoder.reset()
+    return True
+  def set_framing(self, name):
+    if name == self.framing.NAME: return True
+    if not self.set_mode( { 'framing': name } ): return False
+    self.use_framing( name )
+    return True
+
 class Logger:
-  def __init__(self, fname):
+  def __init__(self, fname, mode='w'):
     self.ready = False
-    self.fp = open(fname, 'w')
+    self.fp = open(fname, mode)
     if self.fp is None: return
     self.ready = True
   def __bool__(self):
@@ -92,10 +450,98 @@ class Logger:
     self.separator_minor()
     print('runend:', self.t1, file=self.fp)
     print('runtime:', runtime, file=self.fp)
+  def run_resume(self, t0, descr):
+    # picks up a run begun by an earlier process, whose runbeg
+    # is already in the log; its runtime includes the downtime
+    if not self.ready: return
+    self.t0 = t0
+    self.separator_minor()
+    print('resume:', dt.datetime.now(), descr, file=self.fp)
+    self.separator_minor()
   def close(self):
     if not self.ready: return
     self.fp.close()
 
+class Record_log:
+  # Structured log, one JSON object per line for each event, e.g.
+  #   {"event": "error", "t": 1626884318.02, "run": 0, "line": 1234, "kind": "bitflip", ...}
+  # Records are queued by record(), which only blocks when the queue
+  # is full, and a writer thread turns them into text and writes them
+  # out in batches, flushing at most every interval seconds.
+  def __init__(self, fname, qsize=4096, interval=1.0, mode='w'):
+    self.fname = fname
+    self.fp = open(fname, mode)
+    self.interval = interval
+    self.queue = queue.Queue(qsize)
+    self.thread = threading.Thread( target=self.writer, daemon=True )
+    self.thread.start()
+  def record(self, event, **fields):
+    fields['event'] = event
+    fields['t'] = time.time()
+    self.queue.put(fields)
+  def writer(self):
+    tflush = time.monotonic()
+    done = False
+    while not done:
+      try:
+        batch = [ self.queue.get( timeout=self.interval ) ]
+      except queue.Empty:
+        batch = []
+      # take whatever else is waiting along with it
+      while True:
+        try:
+          batch.append( self.queue.get_nowait() )
+        except queue.Empty:
+          break
+      if None in batch:
+        batch = batch[:batch.index(None)]
+        done = True
+      if batch:
+        self.fp.write( ''.join( [ json.dumps(rec) + '\n' for rec in batch ] ) )
+      if done or time.monotonic() - tflush >= self.interval:
+        self.fp.flush()
+        tflush = time.monotonic()
+  def close(self):
+    self.queue.put(None)
+    self.thread.join()
+    self.fp.close()
+
+class Checkpoint:
+  # Where a long test got to, so a crash costs minutes rather than
+  # the run: the run and next corpus line, the sequence number and
+  # both tallies, saved as JSON at most every interval seconds.
+  # Written aside, synced and renamed over the last one, so the
+  # file is always a whole checkpoint, old or new.
+  def __init__(self, fname='checkpoint.json', interval=60.0):
+    self.fname = fname
+    self.interval = interval
+    self.tsaved = time.monotonic()
+  def due(self):
+    return time.monotonic() - self.tsaved >= self.interval
+  def save(self, state):
+    tmpname = self.fname + '.tmp'
+    with open( tmpname, 'w' ) as fp:
+      json.dump( state, fp )
+      fp.flush()
+      os.fsync( fp.fileno() )
+    os.replace( tmpname, self.fname )
+    self.tsaved = time.monotonic()
+  def load(self):
+    # the last checkpoint, None if there is none
+    try:
+      with open( self.fname ) as fp:
+        return json.load(fp)
+    except FileNotFoundError:
+      return None
+  def remove(self):
+    # once the test is complete there is nothing to resume
+    if os.path.exists( self.fname ): os.remove( self.fname )
+
+def latin_1(data):
+  # received data as text for a record, whatever the codec
+  if isinstance(data, str): return data
+  return bytes(data).decode('latin_1')
+
 class Counter:
   def __init__(self):
     self.reset()
@@ -106,91 +552,581 @@ class Counter:
     self.pkts += pkts
     self.bytes += _bytes
 
+class Histogram:
+  # Round trip times in log sized buckets, fixed memory however long
+  # the run: values below SUB usec have a bucket each, above that
+  # every power of two is split in SUB buckets, so any value is
+  # known to within 1/SUB of itself, up to 2^OCTAVES usec.
+  SUB = 16
+  OCTAVES = 32
+  def __init__(self):
+    self.counts = array('L', [0]) * (self.SUB * (self.OCTAVES+1))
+    self.reset()
+  def state(self):
+    # only the buckets in use, as [index, count] pairs
+    return { 'n': self.n, 'max': self.max,
+             'counts': [ [i, c] for i, c in enumerate(self.counts) if c ] }
+  def restore(self, state):
+    self.reset()
+    for i, c in state['counts']:
+      self.counts[i] = c
+    self.n = state['n']
+    self.max = state['max']
+  def reset(self):
+    for i in range(len(self.counts)):
+      self.counts[i] = 0
+    self.n = 0
+    self.max = 0
+  def index(self, usec):
+    if usec < self.SUB: return usec
+    shift = usec.bit_length() - self.SUB.bit_length()
+    i = self.SUB * (shift+1) + (usec >> shift) - self.SUB
+    return min( i, len(self.counts)-1 )
+  def value(self, i):
+    # the middle of bucket i, usec
+    if i < self.SUB: return float(i)
+    shift, sub = divmod( i - self.SUB, self.SUB )
+    return ( (2*(self.SUB + sub) + 1) << shift ) / 2.0
+  def accum(self, seconds):
+    usec = int( seconds * 1.0e6 )
+    self.counts[self.index(usec)] += 1
+    self.n += 1
+    if usec > self.max: self.max = usec
+  def merge(self, other):
+    for i in range(len(self.counts)):
+      self.counts[i] += other.counts[i]
+    self.n += other.n
+    self.max = max( self.max, other.max )
+  def percentile(self, p):
+    # usec below which p percent of the times fall
+    if self.n == 0: return 0.0
+    rank = p / 100.0 * self.n
+    seen = 0
+    for i, count in enumerate(self.counts):
+      seen += count
+      if count and seen >= rank: return min( self.value(i), float(self.max) )
+    return float(self.max)
+  def summary(self):
+    # p50, p99, p99.9 and max in msec
+    return [ self.percentile(p) / 1.0e3 for p in (50.0, 99.0, 99.9) ] + [ self.max / 1.0e3 ]
+
 class Tally:
   def __init__(self):
     self.all = Counter()
     self.err = Counter()
+    # errors by kind, see mismatch.KINDS
+    self.kinds = {}
+    for kind in mismatch.KINDS:
+      self.kinds[kind] = Counter()
+    # windowed runs only
+    self.ooo = Counter()
+    self.dup = Counter()
+    # send to ack/nak received
+    self.rtt = Histogram()
+    # retransmission runs only: lines delivered, packets sent
+    # again and lines given up on after every retry
+    self.good = Counter()
+    self.retx = Counter()
+    self.lost = Counter()
+    self.seconds = 0.0 # spent sending
+  def counters(self):
+    yield self.all
+    yield self.err
+    for kind in mismatch.KINDS:
+      yield self.kinds[kind]
+    yield self.ooo
+    yield self.dup
+    yield self.good
+    yield self.retx
+    yield self.lost
+  def as_dict(self):
+    return { 'pkts': self.all.pkts, 'bytes': self.all.bytes,
+             'err_pkts': self.err.pkts, 'err_bytes': self.err.bytes,
+             'kinds': { kind: self.kinds[kind].pkts for kind in mismatch.KINDS },
+             'ooo': self.ooo.pkts, 'dup': self.dup.pkts,
+             'good_pkts': self.good.pkts, 'good_bytes': self.good.bytes,
+             'retx_pkts': self.retx.pkts, 'retx_bytes': self.retx.bytes,
+             'lost_pkts': self.lost.pkts, 'lost_bytes': self.lost.bytes,
+             'seconds': self.seconds,
+             'rtt_msec': dict( zip( ('p50', 'p99', 'p99.9', 'max'), self.rtt.summary() ) ) }
+  def state(self):
+    # everything, for a Checkpoint
+    return { 'counters': [ [c.pkts, c.bytes] for c in self.counters() ],
+             'seconds': self.seconds, 'rtt': self.rtt.state() }
+  def restore(self, state):
+    for c, (pkts, _bytes) in zip( self.counters(), state['counters'] ):
+      c.pkts = pkts
+      c.bytes = _bytes
+    self.seconds = state['seconds']
+    self.rtt.restore( state['rtt'] )
+  def merge(self, other):
+    for mine, theirs in zip( self.counters(), other.counters() ):
+      mine.accum( theirs.pkts, theirs.bytes )
+    self.seconds += other.seconds
+    self.rtt.merge( other.rtt )
   def reset(self):
+    self.rtt.reset()
     self.all.reset()
     self.err.reset()
+    self.ooo.reset()
+    self.dup.reset()
+    self.good.reset()
+    self.retx.reset()
+    self.lost.reset()
+    self.seconds = 0.0
+    for kind in self.kinds:
+      self.kinds[kind].reset()
 
 class Totals:
   def __init__(self):
     self.prg = Tally()
     self.run = Tally()
+    self.metrics = None # a metrics.Metrics fed as they accumulate
   def all_accum(self, pkts, _bytes):
     self.prg.all.accum( pkts, _bytes)
     self.run.all.accum( pkts, _bytes)
+    if self.metrics is not None: self.metrics.sent( pkts, _bytes )
+  def rtt_accum(self, seconds):
+    self.prg.rtt.accum( seconds )
+    self.run.rtt.accum( seconds )
   def err_accum(self, pkts, _bytes):
     self.prg.err.accum( pkts, _bytes)
     self.run.err.accum( pkts, _bytes)
+  def kind_accum(self, kind, pkts, _bytes):
+    self.prg.kinds[kind].accum( pkts, _bytes)
+    self.run.kinds[kind].accum( pkts, _bytes)
+    if self.metrics is not None: self.metrics.error( kind, pkts, _bytes )
+  def ooo_accum(self, pkts, _bytes):
+    self.prg.ooo.accum( pkts, _bytes)
+    self.run.ooo.accum( pkts, _bytes)
+    if self.metrics is not None: self.metrics.out_of_order( pkts )
+  def dup_accum(self, pkts, _bytes):
+    self.prg.dup.accum( pkts, _bytes)
+    self.run.dup.accum( pkts, _bytes)
+    if self.metrics is not None: self.metrics.duplicate( pkts )
+  def good_accum(self, pkts, _bytes):
+    self.prg.good.accum( pkts, _bytes)
+    self.run.good.accum( pkts, _bytes)
+  def retx_accum(self, pkts, _bytes):
+    self.prg.retx.accum( pkts, _bytes)
+    self.run.retx.accum( pkts, _bytes)
+  def lost_accum(self, pkts, _bytes):
+    self.prg.lost.accum( pkts, _bytes)
+    self.run.lost.accum( pkts, _bytes)
+  def time_accum(self, seconds):
+    self.prg.seconds += seconds
+    self.run.seconds += seconds
+  def merge(self, other):
+    # adds in the tallies of another Totals
+    for mine, theirs in ( (self.prg, other.prg), (self.run, other.run) ):
+      mine.merge( theirs )
   def run_reset(self):
     self.run.all.reset()
     self.run.err.reset()
 
-def main():
+class Tester:
+  # Sends the corpus to one Tarte-Py and checks what comes back.
+  #   codec 'text' builds and parses packets as str,
+  #   codec 'bytes' works on the raw serial bytes throughout.
+  #   pkcache sends pre-encoded packets from the Corpus_cache,
+  #   which implies the bytes codec.
+  #   cksum names the checksum engine, upacket.CHECKSUMS, crc32
+  #   if None
+  #   batch > 0 sends consecutive lines together in payloads of up
+  #   to batch bytes, see Batches; the line numbers of the runs
+  #   and checkpoints are then those of the batches
+  def __init__(self, link, corpus, logger, codec='text', pkcache=False, cksum=None, batch=0):
+    self.link = link
+    self.corpus = corpus
+    self.logger = logger
+    self.cksum = cksum
+    self.cache = None
+    self.batches = None
+    if pkcache and batch:
+      raise ValueError('the packet cache holds single lines, it cannot be batched')
+    if pkcache:
+      self.cache = Corpus_cache(corpus, cksum=cksum)
+      codec = 'bytes'
+    self.codec = codec
+    if codec == 'bytes':
+      self.Pk = upacket.Packet_bytes
+      self.source = corpus.bsource
+    else:
+      self.Pk = upacket.Packet
+      self.source = corpus.source
+    if batch:
+      self.batches = Batches( self.source, corpus.lengths, batch )
+      self.source = self.batches
+    self.px = self.Pk() # original packet to send
+    self.pr = self.Pk() # echoed back from tarte-py
+    self.po = self.Pk() # reconstructed original packet
+    self.pa = self.Pk() # ack/nak packet
+    self.asc = upacket.Ascii.shared()
+    self.totals = Totals() # tally of data and errors
+    self.records = None    # a Record_log, errors go there instead of the logger
+    self.run = 0
+    self.cursor = 0  # corpus line being sent
+    self.seq = 0
+    self.verbose = True
+    self.wire_tx = 0 # bytes sent and received on the wire,
+    self.wire_rx = 0 # framing and replies included
+    self.checkpoint = None # a Checkpoint, saved as the runs go
+    self.retry = 0         # > 0 resends a line that many times at most
+    self.tmark = time.monotonic() # sending time is tallied up to here
+    self.config = {}       # main() settings, kept in the checkpoint
 
-  c = Corpus()
-  p = Port(portname='/dev/ttyUSB0')
-  px = upacket.Packet()
-  pr = upacket.Packet()
-  po = upacket.Packet() # reconstructed original packet
-  pa = upacket.Packet() # ack/nak packet
-  asc = upacket.Ascii()
-  retry = 10
+  def packet(self, i, seq=None):
+    # the wire packet for line i and its payload size;
+    # packets with a sequence number are never cached
+    if self.cache is not None and seq is None:
+      return self.cache.packet(i), self.cache.size(i)
+    self.px.generate(self.source[i], cksum=self.cksum, seq=seq)
+    return self.px.packet, int(self.px.size)
 
-  totals = Totals() # tally of data and errors
+  def check(self, i, pkt, size, nsent, packets, seq=None):
+    # Checks the echo and ack/nak frames received for line i,
+    # tallying and logging any error. px must hold the packet
+    # sent unless it came from the cache or carries a seq.
+    totals = self.totals
+    logger = self.logger
+    px, pr, po, pa = self.px, self.pr, self.po, self.pa
+    current = self.cache is None and seq is None
+    self.wire_tx += nsent
+    self.wire_rx += sum( [ len(ppp) for ppp in packets ] )
+    if self.codec != 'bytes':
+      packets = [ ppp.decode('latin_1') for ppp in packets ]
+    buff = self.Pk.RSEP.join(packets)
+    if len(packets) != 2:
+      lines = self.damaged( i, size )
+      totals.err_accum( 1, lines[2] )
+      totals.kind_accum( 'framing', 1, lines[2] )
+      if not current: px.generate(self.source[i], cksum=self.cksum, seq=seq) # only for the log
+      if self.records is not None:
+        self.records.record( 'error', run=self.run, line=i, seq=seq, kind='framing',
+                             size=size, nsent=nsent, nframes=len(packets),
+                             sent=latin_1(px.packet), received=latin_1(buff),
+                             **self.batch_fields(lines) )
+        return False
+      print('\nNumber received packets not two', file=logger.fp)
+      print('  px:', px, file=logger.fp)
+      if self.batches is not None: print('  lines:', lines[0], lines[1]-1, file=logger.fp)
+      if self.codec == 'bytes': buff = buff.decode('latin_1')
+      print('  rbuff:', self.asc.pretty(buff), file=logger.fp)
+      print('  len packets', len(packets), file=logger.fp)
+      print('  packets:', file=logger.fp)
+      for ppp in packets:
+        print(ppp, file=logger.fp)
+      logger.fp.flush()
+      return False
+    rbuff = packets[0]
+    abuff = packets[1]
+    pr.parse(rbuff)
+    obuff = self.link.framing.unwrap(pr.payload)
+    pa.parse(abuff)
+    if current:
+      po.parse(obuff)
+      match = px == po
+    else:
+      # the echo must give back exactly the packet sent,
+      # so there is no need to build px and po at all
+      match = obuff == pkt
+      if not match:
+        px.generate(self.source[i], cksum=self.cksum, seq=seq) # only for the log
+        po.parse(obuff)
+    if not match:
+      # locate the damage in the echo against the echo expected
+      pe = self.Pk(self.link.framing.wrap(pkt), 'pkecho', self.cksum, seq)
+      mm = mismatch.classify(pe.packet, rbuff)
+      if mm is None: mm = mismatch.Mismatch('other')
+      lines = self.damaged( i, size, pkt, pe.packet, rbuff )
+      totals.err_accum( 1, lines[2] )
+      totals.kind_accum( mm.kind, 1, lines[2] )
+      if self.records is not None:
+        self.records.record( 'error', run=self.run, line=i, seq=seq, kind=mm.kind,
+                             pos=mm.pos, length=mm.length, nbits=mm.nbits,
+                             size=size, nsent=nsent, nframes=len(packets),
+                             sent=latin_1(px.packet), received=latin_1(rbuff),
+                             **self.batch_fields(lines) )
+        return match
+      print(px.size, nsent, len(buff), match, file=logger.fp)
+      print('  px:', px, file=logger.fp)
+      print('  pr:', pr, file=logger.fp)
+      print('  po:', po, file=logger.fp)
+      print('  pa:', pa, file=logger.fp)
+      print('  kind:', mm, file=logger.fp)
+      if self.batches is not None: print('  lines:', lines[0], lines[1]-1, file=logger.fp)
+      logger.fp.flush()
+    return match
 
-  logger = Logger('logfile.txt')
-  if not logger:
-    print('error opening logfile')
-    exit(99)
+  def damaged(self, i, size, pkt=None, expected=None, received=None):
+    # (first, last+1, bytes) of the corpus lines lost with packet i.
+    # With batches, those the damage to the echo received falls on,
+    # located against the echo expected; all of the batch if there
+    # is no echo or the damage is outside the payload. Offsets in
+    # the echo map one to one to the payload unless the text
+    # framing had to escape bytes of it, which corpus lines never need.
+    if self.batches is None: return i, i+1, size
+    span = None
+    if expected is not None:
+      span = mismatch.span( expected, received )
+      usep = self.Pk.USEP
+      def payload_start(packet):
+        return packet.index( usep, packet.index(usep) + 1 ) + 1
+      base = payload_start(expected) + len( self.link.framing.wrap( pkt[:payload_start(pkt)] ) )
+      if span is not None:
+        beg, end = max( span[0] - base, 0 ), min( span[1] - base, size )
+        span = (beg, end) if beg < end else None
+    return self.batches.lines( i, span )
 
-  for run in range(4):
-    logger.run_beg(f'Run # {run}')
-    totals.run.reset()
-
-    for i,line in enumerate(c.source):
-      time.sleep(0.005)
-      px.generate(line)
-      nsent = p.send(px.packet)
-      totals.all_accum( 1, int(px.size) )
-      buff = p.recv(1024)
-      packets = buff.split(px.RSEP)
-      if len(packets) != 2:
-        totals.err_accum( 1, int(px.size) )
-        print('\nNumber received packets not two', file=logger.fp)
-        print('  px:', px, file=logger.fp)
-        print('  rbuff:', asc.pretty(buff), file=logger.fp)
-        print('  len packets', len(packets), file=logger.fp)
-        print('  packets:', file=logger.fp)
-        for ppp in packets: 
-          print(ppp, file=logger.fp)
-        logger.fp.flush()
+  def batch_fields(self, lines):
+    # the lines of a batch error record
+    if self.batches is None: return {}
+    return { 'lines': [ lines[0], lines[1] ], 'line_bytes': lines[2] }
+
+  def run_all(self, framings=('text',), window=0, nruns=4, resume=None):
+    # resume is a checkpoint state to carry on from, its totals
+    # already restored, see resume(); a run it leaves at line 0
+    # starts afresh. True if every run was completed.
+    link = self.link
+    logger = self.logger
+    completed = True
+    first, beg = 0, 0
+    if resume is not None: first, beg = resume['run'], resume['line']
+    for run in range(first, nruns):
+      framing = framings[run % len(framings)]
+      if not link.set_framing(framing):
+        print(f'Run {run}: Tarte-Py did not switch to {framing} framing')
+        completed = False
+        break
+      self.run = run
+      batched = f' batch {self.batches.limit}' if self.batches is not None else ''
+      if resume is not None and run == first and beg > 0:
+        logger.run_resume( dt.datetime.fromisoformat(resume['runbeg']), f'run {run} line {beg}' )
+        if self.records is not None:
+          self.records.record( 'resume', run=run, line=beg )
       else:
-        rbuff = packets[0]
-        abuff = packets[1]
-        stat = pr.parse(rbuff)
-        obuff = upacket.Packet.unserialize(pr.payload)
-        stats = po.parse(obuff)
-        #print(stats)
-        pa.parse(abuff)
-        match = px == po
-        if not match:
-          totals.err_accum( 1, int(px.size) )
-          print(px.size, nsent, len(buff), match, file=logger.fp)
-          print('  px:', px, file=logger.fp)
-          print('  pr:', pr, file=logger.fp)
-          print('  po:', po, file=logger.fp)
-          print('  pa:', pa, file=logger.fp)
-          logger.fp.flush()
-
-      if i % 1000 == 0:
-        print(f'Run {run}: '
-              f'{totals.run.all.pkts:12} {totals.run.all.bytes:12}   '
-              f'{totals.run.err.pkts:12} {totals.run.err.bytes:12}')
-
-    print(f'Run {run} Completed')
+        if window: logger.run_beg(f'Run # {run} framing {framing} window {window}{batched}')
+        else: logger.run_beg(f'Run # {run} framing {framing}{batched}')
+        self.totals.run.reset()
+        beg = 0
+        if self.records is not None:
+          self.records.record( 'run_beg', run=run, framing=framing, window=window )
+      t0 = time.monotonic()
+      self.tmark = t0
+
+      if window: self.run_window(window, beg=beg)
+      else: self.run_stop_and_wait(beg=beg)
+      self.clock()
+
+      if self.verbose: print(f'Run {run} Completed')
+      if self.records is not None:
+        self.records.record( 'run_end', run=run, seconds=time.monotonic()-t0,
+                             totals=self.totals.run.as_dict(), cumul=self.totals.prg.as_dict() )
+      self.summary()
+      logger.run_end()
+      logger.fp.flush()
+      if self.checkpoint is not None: self.save_checkpoint( run+1, 0 )
+
+    link.set_framing('text')
+    return completed
+
+  def save_checkpoint(self, run, line):
+    # line is the next one to send, every line before it tallied;
+    # the log is flushed first so it has all the checkpoint counts
+    self.clock()
+    self.logger.fp.flush()
+    self.checkpoint.save( { 'run': run, 'line': line, 'seq': self.seq,
+                            'runbeg': self.logger.t0.isoformat() if hasattr(self.logger, 't0') else None,
+                            'corpus': [ self.corpus.fname, self.corpus.nlines ],
+                            'config': self.config,
+                            'prg': self.totals.prg.state(),
+                            'run_totals': self.totals.run.state() } )
+
+  def resume(self, state):
+    # the tallies and sequence number of a checkpoint, which must
+    # have been taken over this same corpus
+    if state['corpus'] != [ self.corpus.fname, self.corpus.nlines ]:
+      raise ValueError(f'checkpoint is of corpus {state["corpus"]}, not {self.corpus.fname}')
+    self.totals.prg.restore( state['prg'] )
+    self.totals.run.restore( state['run_totals'] )
+    self.seq = state['seq']
+
+  def clock(self):
+    # tallies the time spent sending since the last call
+    now = time.monotonic()
+    self.totals.time_accum( now - self.tmark )
+    self.tmark = now
+
+  def acked(self):
+    # whether the ack/nak of the last reply checked is an ack
+    payload = self.pa.payload
+    if self.codec == 'bytes': payload = bytes(payload).decode('latin_1')
+    status = upacket.Parsing_status()
+    return status.unserialize( payload ) and bool(status)
+
+  def resend(self, size, ok, tries):
+    # Settles a line whose packet has been sent tries+1 times,
+    # ok if its echo matched and was acked, tallying it as
+    # delivered, to be sent again or, after retry resends, lost.
+    totals = self.totals
+    if ok:
+      totals.good_accum( 1, size )
+      return False
+    if tries < self.retry:
+      totals.retx_accum( 1, size )
+      return True
+    totals.lost_accum( 1, size )
+    return False
+
+  def progress(self, i):
+    self.cursor = i
+    if self.totals.metrics is not None: self.totals.metrics.position( self.run, i )
+    if self.verbose and i % 1000 == 0:
+      totals = self.totals
+      print(f'Run {self.run}: '
+            f'{totals.run.all.pkts:12} {totals.run.all.bytes:12}   '
+            f'{totals.run.err.pkts:12} {totals.run.err.bytes:12}')
+
+  def run_stop_and_wait(self, delay=0.005, beg=0, end=None):
+    # one packet at a time, waiting for its echo and ack/nak,
+    # for corpus lines beg to end, all of them by default
+    # with retry, each line is sent again until it gets through
+    if end is None: end = len(self.source)
+    for i in range(beg, end):
+      tries = 0
+      while True:
+        time.sleep(delay)
+        pkt, size = self.packet(i)
+        tsent = time.monotonic()
+        nsent = self.link.send(pkt)
+        self.totals.all_accum( 1, size )
+        packets = self.link.recv(2, nsent)
+        if len(packets) == 2: self.totals.rtt_accum( time.monotonic() - tsent )
+        match = self.check( i, pkt, size, nsent, packets )
+        # A late reply would be read as the next one, and so on.
+        # One not all in may yet take the turnaround to come; after
+        # two whole frames anything more follows on closely.
+        if not match: self.link.drain( None if len(packets) < 2 else self.link.port.gap() )
+        if not self.retry or not self.resend( size, match and self.acked(), tries ): break
+        tries += 1
+      self.progress(i)
+      if self.checkpoint is not None and self.checkpoint.due():
+        self.save_checkpoint( self.run, i+1 )
+
+  def frame_id(self, frame):
+    # packet type and sequence number of a received frame,
+    # read from its sync field alone; (None, None) if unreadable
+    j = bytes(frame[:upacket.Packet_bytes.WINDOW]).find(upacket.Packet_bytes.USEP)
+    if j < 0: return None, None
+    sync, cksum, seq = upacket.Packet_bytes.split_sync( bytes(frame[:j]) )
+    if sync is None: return None, None
+    return sync[:upacket.Packet_type.PTYPE_LEN].upper(), seq
+
+  def run_window(self, window, timeout=1.0, delay=0.0, beg=0, end=None):
+    # Keeps up to window packets in flight, each carrying a
+    # sequence number that the Tarte-Py returns in the sync of its
+    # echo and ack/nak, so replies are matched to their packet
+    # whatever order they arrive in. Echoes arriving after that of
+    # a later packet count as out of order, echoes for a packet
+    # already done as duplicates, and a packet with no complete
+    # reply after timeout seconds is checked with what did arrive,
+    # a loss showing up as a framing error. With retry, a line
+    # that fails is sent again with a new seq, ahead of new lines.
+    link = self.link
+    totals = self.totals
+    inflight = {} # seq -> [ line, packet, size, nsent, tsent, echo, acknak, tries ], oldest first
+    done = []     # seqs recently completed, to tell duplicates
+    again = []    # [ line, tries ] of lines to send again
+    self.last = -1
+    saved = link.port.timeout
+    link.port.set_timeout( 0.002 )
+    if self.batches is not None:
+      # a window of big payloads takes a while to get through
+      nmax = self.batches.limit + upacket.Packet_bytes.OVERHEAD
+      timeout += window * link.port.deadline( nmax + link.reply_size(nmax) )
+    i = beg
+    n = len(self.source) if end is None else end
+    def settle(seq):
+      entry = self.retire( seq, inflight, done, window )
+      match = self.check_entry( seq, entry )
+      if self.retry and self.resend( entry[2], match and self.acked(), entry[7] ):
+        again.append( [ entry[0], entry[7]+1 ] )
+    while i < n or inflight or again:
+      # a checkpoint waits for the window to drain, so that every
+      # line before the next one to send is tallied
+      draining = self.checkpoint is not None and self.checkpoint.due()
+      if draining and not inflight and not again:
+        self.save_checkpoint( self.run, i )
+        draining = False
+      while (i < n or again) and len(inflight) < window and not draining:
+        if delay: time.sleep(delay)
+        if again:
+          line, tries = again.pop(0)
+        else:
+          line, tries = i, 0
+          self.progress(i)
+          i += 1
+        seq = self.next_seq()
+        pkt, size = self.packet(line, seq)
+        nsent = link.send(pkt)
+        totals.all_accum( 1, size )
+        inflight[seq] = [ line, pkt, size, nsent, time.monotonic(), None, None, tries ]
+      for frame in link.poll():
+        seq = self.take_frame( frame, inflight, done )
+        if seq is not None: settle(seq)
+      now = time.monotonic()
+      while inflight:
+        seq = next(iter(inflight))
+        if now - inflight[seq][4] <= timeout: break
+        settle(seq)
+    link.port.set_timeout( saved )
+
+  def next_seq(self):
+    seq = self.seq
+    self.seq = (self.seq + 1) % upacket.Packet_type.SEQ_MOD
+    return seq
+
+  def take_frame(self, frame, inflight, done):
+    # Files an echo or ack/nak frame with its packet in flight,
+    # counting the echoes out of order or duplicated. Returns the
+    # seq of the packet once it has both replies, else None.
+    totals = self.totals
+    sync, seq = self.frame_id(frame)
+    entry = inflight.get(seq)
+    if sync == b'PKECHO':
+      if entry is None or entry[5] is not None:
+        if seq in done or entry is not None:
+          totals.dup_accum( 1, len(frame) )
+        return None
+      # by send time, so a line sent again is not out of order
+      if entry[4] < self.last: totals.ooo_accum( 1, entry[2] )
+      else: self.last = entry[4]
+      entry[5] = frame
+    elif sync == b'ACKNAK' and entry is not None:
+      entry[6] = frame
+    else:
+      return None
+    if entry[5] is None or entry[6] is None: return None
+    return seq
+
+  def retire(self, seq, inflight, done, window):
+    # takes a packet out of flight, remembering its seq for a while,
+    # and times it if both its replies are in
+    entry = inflight.pop(seq)
+    if entry[5] is not None and entry[6] is not None:
+      self.totals.rtt_accum( time.monotonic() - entry[4] )
+    done.append(seq)
+    if len(done) > 4*window: del done[0]
+    return entry
+
+  def check_entry(self, seq, entry):
+    line, pkt, size, nsent, tsent, echo, acknak = entry[:7]
+    packets = [ frame for frame in (echo, acknak) if frame is not None ]
+    return self.check( line, pkt, size, nsent, packets, seq )
+
+  def summary(self):
+    totals = self.totals
+    logger = self.logger
     prg_error = float(totals.prg.err.bytes) / float(totals.prg.all.bytes)
     prg_error100 = prg_error * 100.0
     prg_error1e6 = prg_error * 1.0e6
@@ -204,9 +1140,105 @@ def main():
     print(f'Error bytes.....> {totals.run.err.bytes:12}\t{totals.prg.err.bytes:12}', file=logger.fp )
     print(f'Error percent...> {run_error100:12.2f} %\t{prg_error100:12.2f} %', file=logger.fp )
     print(f'Error ppm.......> {run_error1e6:12.2f} ppm\t{prg_error1e6:12.2f} ppm', file=logger.fp )
-    logger.run_end()
-    logger.fp.flush()
+    for kind in mismatch.KINDS:
+      print(f'Errors {kind:.<10s}> {totals.run.kinds[kind].pkts:12} \t{totals.prg.kinds[kind].pkts:12}', file=logger.fp )
+    print(f'Out of order....> {totals.run.ooo.pkts:12} \t{totals.prg.ooo.pkts:12}', file=logger.fp )
+    print(f'Duplicates......> {totals.run.dup.pkts:12} \t{totals.prg.dup.pkts:12}', file=logger.fp )
+    run_rtt = totals.run.rtt.summary()
+    prg_rtt = totals.prg.rtt.summary()
+    for k, name in enumerate( ('p50', 'p99', 'p99.9', 'max') ):
+      print(f'RTT {name:.<12s}> {run_rtt[k]:12.3f} ms\t{prg_rtt[k]:12.3f} ms', file=logger.fp )
+    if self.retry: self.summary_retry()
+
+  def summary_retry(self):
+    # what got through once errors were recovered: goodput is
+    # the payload delivered per second, raw all payload sent,
+    # resends included; residual errors are lines never delivered
+    totals = self.totals
+    logger = self.logger
+    def rates(t):
+      seconds = t.seconds if t.seconds > 0.0 else float('inf')
+      settled = t.good.bytes + t.lost.bytes
+      return ( t.all.bytes / seconds, t.good.bytes / seconds,
+               100.0 * t.retx.pkts / t.all.pkts if t.all.pkts else 0.0,
+               1.0e6 * t.lost.bytes / settled if settled else 0.0 )
+    run, prg = rates(totals.run), rates(totals.prg)
+    print(f'Delivered.......> {totals.run.good.pkts:12} \t{totals.prg.good.pkts:12}', file=logger.fp )
+    print(f'Resent..........> {totals.run.retx.pkts:12} \t{totals.prg.retx.pkts:12}', file=logger.fp )
+    print(f'Undelivered.....> {totals.run.lost.pkts:12} \t{totals.prg.lost.pkts:12}', file=logger.fp )
+    print(f'Raw rate........> {run[0]:12.1f} B/s\t{prg[0]:12.1f} B/s', file=logger.fp )
+    print(f'Goodput.........> {run[1]:12.1f} B/s\t{prg[1]:12.1f} B/s', file=logger.fp )
+    print(f'Resent ratio....> {run[2]:12.2f} %\t{prg[2]:12.2f} %', file=logger.fp )
+    print(f'Residual ppm....> {run[3]:12.2f} ppm\t{prg[3]:12.2f} ppm', file=logger.fp )
+
+def main(codec='text', pkcache=False, framings=('text',), cksum=None, window=0, corpus=None,
+         portname='/dev/ttyUSB0', records=False, metrics_port=None, resume=False, reliable=False,
+         batch=0, turnaround=Port.TURNAROUND):
+  # codec, pkcache and cksum as for the Tester.
+  # framings are used in turn, one per run, so a link can be
+  # compared under the 'text' and the binary 'cobs' framing;
+  # 'cobs' implies the bytes codec.
+  # window > 0 pipelines that many packets in flight, matched
+  # to their replies by sequence number, instead of stop-and-wait
+  # corpus replaces source.agc, e.g. by a stress.Stress_corpus
+  # portname may be the pty of a tpemu.Emulator
+  # records logs errors and run totals as JSON lines to logfile.jsonl,
+  # written by a background thread, the text log keeping the summaries
+  # metrics_port serves live metrics on http://localhost:port/metrics
+  # and snapshots them to metrics.json, see metrics.py
+  # reliable sends a line again, up to retry times, when its echo
+  # is lost, damaged or nakked, and reports goodput, resends and
+  # residual errors alongside the raw error rates
+  # batch > 0 packs consecutive lines into payloads of up to that
+  # many bytes, Batches.MAX at most, errors still counted and
+  # logged by the lines they hit
+  # turnaround, seconds allowed for the Tarte-Py to start a reply,
+  # see Port
+  # Progress is checkpointed to checkpoint.json every minute;
+  # resume carries on from there with the settings of the
+  # interrupted test, appending to its logs.
+
+  checkpoint = Checkpoint('checkpoint.json')
+  state = None
+  if resume:
+    state = checkpoint.load()
+    if state is None:
+      print('no checkpoint to resume from')
+      return
+    config = state['config']
+    codec, pkcache, cksum, window = config['codec'], config['pkcache'], config['cksum'], config['window']
+    reliable, batch = config['reliable'], config['batch']
+    framings = tuple( config['framings'] )
+  c = Corpus() if corpus is None else corpus
+  p = Port(portname=portname, turnaround=turnaround)
+  link = Link(p)
+  if 'cobs' in framings:
+    codec = 'bytes'
+  retry = 10
+
+  mode = 'a' if state is not None else 'w'
+  logger = Logger('logfile.txt', mode)
+  if not logger:
+    print('error opening logfile')
+    exit(99)
+
+  tester = Tester(link, c, logger, codec, pkcache, cksum, batch)
+  tester.checkpoint = checkpoint
+  if reliable: tester.retry = retry
+  tester.config = { 'codec': codec, 'pkcache': pkcache, 'cksum': cksum,
+                    'window': window, 'framings': list(framings), 'reliable': reliable,
+                    'batch': batch }
+  if state is not None: tester.resume( state )
+  if records: tester.records = Record_log('logfile.jsonl', mode=mode)
+  if metrics_port is not None:
+    tester.totals.metrics = metrics.Metrics()
+    tester.totals.metrics.serve( metrics_port )
+    tester.totals.metrics.snapshots( 'metrics.json' )
+  # an unfinished test keeps its checkpoint, to be resumed
+  if tester.run_all(framings, window, resume=state): checkpoint.remove()
 
+  if records: tester.records.close()
+  if metrics_port is not None: tester.totals.metrics.stop()
   logger.close()
 
 
@@ -220,7 +1252,7 @@ def main():
     po = upacket.Packet() # reconstructed original packet
     pa = upacket.Packet() # ack/nak packet
     retry = 10
-    asc = upacket.Ascii()
+    asc = upacket.Ascii.shared()
 
     totals = Totals() # tally of data and errors
 
@@ -285,5 +1317,20 @@ def main():
                end='\r')
 
 
-#if __name__ == "__main__":
-#  main()
+if __name__ == "__main__":
+  import argparse
+  parser = argparse.ArgumentParser( description='Serial link test of the Tarte-Py' )
+  parser.add_argument( '--port', default='/dev/ttyUSB0' )
+  parser.add_argument( '--codec', choices=('text', 'bytes'), default='text' )
+  parser.add_argument( '--framing', action='append', choices=tuple(upacket.FRAMINGS), help='one per run in turn, text by default' )
+  parser.add_argument( '--window', type=int, default=0, help='packets in flight, 0 for stop-and-wait' )
+  parser.add_argument( '--records', action='store_true', help='errors and run totals to logfile.jsonl' )
+  parser.add_argument( '--metrics', type=int, default=None, metavar='PORT', help='serve live metrics on this port' )
+  parser.add_argument( '--reliable', action='store_true', help='resend failed lines and report goodput' )
+  parser.add_argument( '--batch', type=int, default=0, metavar='BYTES', help=f'lines packed into payloads of up to this size, {Batches.MAX} at most' )
+  parser.add_argument( '--turnaround', type=float, default=Port.TURNAROUND, metavar='SECONDS', help='allowed for the Tarte-Py to start a reply' )
+  parser.add_argument( '--resume', action='store_true', help='carry on from checkpoint.json' )
+  args = parser.parse_args()
+  main( codec=args.codec, framings=tuple(args.framing or ('text',)), window=args.window,
+        portname=args.port, records=args.records, metrics_port=args.metrics, resume=args.resume,
+        reliable=args.reliable, batch=args.batch, turnaround=args.turnaround )
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Synthetic stress payloads, for what the AGC text never sends:
+# long runs of 0x00 and 0xFF, high-bit bytes, separator-like bytes
+# and payloads up to the 16 bit size limit. Patterns:
+#   prbs7 prbs15 prbs23   ITU pseudo-random bit sequences
+#   alt                   0x55, alternating bits
+#   toggle                0x00 0xFF 0x00 ..., every bit flips each byte
+#   runs                  long runs of 0x00 and 0xFF
+#   seps                  US, RS, CR, NUL and '{' among random bytes
+#   high                  random bytes with the top bit set
+#   random                uniform random bytes
+# Everything is drawn from numpy's generator seeded by the caller,
+# so a failing payload is replayed by giving the same seed. A whole
+# set of payloads is generated at once into one buffer, which a
+# Stress_corpus serves in place of the Corpus:
+#   rtester.main( corpus=stress.Stress_corpus('prbs15', 1000, seed=7),
+#                 framings=('cobs',) )
+# Separator bytes in a payload break the text framing by design;
+# use the cobs framing to see errors on the wire rather than in it.
+#   ./stress.py [count] [seed]   generation rates of every pattern
+
+import sys
+import time
+import hashlib
+import numpy as np
+import upacket
+import rtester
+
+SIZE_LIMIT = 0xffff # the 4 nibble SIZE field
+# largest payload whose whole packet still fits an echo, with room
+# to spare for the checksum and sequence number sync extensions
+MAXLEN = SIZE_LIMIT - 2*upacket.Packet_bytes.OVERHEAD
+
+# feedback taps (n, m) of x^n + x^m + 1
+PRBS_TAPS = { 7: (7, 6), 15: (15, 14), 23: (23, 18) }
+
+def prbs_bits(order, nbits, state=1):
+  # The sequence a[k] = a[k-n] ^ a[k-m] from an n bit starting
+  # state. Its polynomial squared j times gives the same recurrence
+  # at lags n<<j and m<<j, so once 2^j*n bits exist the next m<<j
+  # come in one vectorized step and the whole takes log(nbits) steps.
+  n, m = PRBS_TAPS[order]
+  bits = np.zeros( max(nbits, n), dtype=np.uint8 )
+  state %= (1 << n) - 1
+  if state == 0: state = 1
+  bits[:n] = (state >> np.arange(n)) & 1
+  k = n
+  j = 0
+  while k < nbits:
+    while (n << (j+1)) <= k: j += 1
+    end = min( k + (m << j), nbits )
+    bits[k:end] = bits[k-(n<<j):end-(n<<j)] ^ bits[k-(m<<j):end-(m<<j)]
+    k = end
+  return bits[:nbits]
+
+def prbs_bytes(order, state=1):
+  # one period of the sequence packed into bytes; eight periods of
+  # bits make a whole number of bytes that repeat end to end
+  period = (1 << order) - 1
+  return np.packbits( prbs_bits(order, 8*period, state) )
+
+class Stress:
+  PATTERNS = ( 'prbs7', 'prbs15', 'prbs23', 'alt', 'toggle', 'runs', 'seps', 'high', 'random' )
+  SEPARATORS = np.frombuffer( b'\x1f\x1e\r\x00{', dtype=np.uint8 )
+
+  def __init__(self, pattern='prbs15', seed=1, minlen=1, maxlen=MAXLEN):
+    if pattern not in self.PATTERNS:
+      raise ValueError(f'unknown stress pattern {pattern!r}')
+    if not 0 <= minlen <= maxlen <= SIZE_LIMIT:
+      raise ValueError(f'payload lengths {minlen}..{maxlen} outside 0..{SIZE_LIMIT}')
+    self.pattern = pattern
+    self.seed = seed
+    self.minlen = minlen
+    self.maxlen = maxlen
+    self.rng = np.random.default_rng(seed)
+    self.stream = None
+    self.pos = 0
+    if pattern.startswith('prbs'):
+      self.stream = prbs_bytes( int(pattern[4:]), int(self.rng.integers(1, 1 << 23)) )
+
+  def lengths(self, count):
+    return self.rng.integers( self.minlen, self.maxlen, size=count, endpoint=True )
+
+  def fill(self, nbytes):
+    # the next nbytes of the pattern
+    if self.stream is not None:
+      end = self.pos + nbytes
+      data = np.tile( self.stream, end // len(self.stream) + 1 )[self.pos:end]
+      self.pos = end % len(self.stream)
+      return data
+    if self.pattern == 'alt':
+      return np.full( nbytes, 0x55, dtype=np.uint8 )
+    if self.pattern == 'toggle':
+      return np.tile( np.array( [0x00, 0xff], dtype=np.uint8 ), nbytes//2 + 1 )[:nbytes]
+    if self.pattern == 'runs':
+      # runs of 16 to 4096 bytes, alternately 0x00 and 0xFF
+      runs = self.rng.integers( 16, 4096, size=nbytes//2000 + 2, endpoint=True )
+      while runs.sum() < nbytes:
+        runs = np.append( runs, self.rng.integers( 16, 4096, size=len(runs), endpoint=True ) )
+      levels = np.tile( np.array( [0x00, 0xff], dtype=np.uint8 ), len(runs)//2 + 1 )[:len(runs)]
+      return np.repeat( levels, runs )[:nbytes]
+    data = self.rng.integers( 0, 256, size=nbytes, dtype=np.uint8 )
+    if self.pattern == 'high':
+      data |= 0x80
+    elif self.pattern == 'seps':
+      # about one byte in eight a separator
+      where = self.rng.random(nbytes) < 0.125
+      data[where] = self.rng.choice( self.SEPARATORS, size=int(where.sum()) )
+    return data
+
+  def generate(self, count):
+    # count payloads as one buffer, their offsets and lengths
+    lengths = self.lengths(count).astype(np.uint32)
+    offsets = np.zeros( count, dtype=np.int64 )
+    np.cumsum( lengths[:-1], out=offsets[1:] )
+    return self.fill( int(lengths.sum()) ).tobytes(), offsets, lengths
+
+class Stress_corpus:
+  # Stands in for a Corpus: count payloads of one pattern, served
+  # by the same lazy sequences over one buffer.
+  def __init__(self, pattern='prbs15', count=1000, seed=1, minlen=1, maxlen=MAXLEN, verbose=True):
+    self.stress = Stress(pattern, seed, minlen, maxlen)
+    self.fname = f'stress-{pattern}-{seed}-{count}-{minlen}-{maxlen}'
+    self.map, self.offsets, self.lengths = self.stress.generate(count)
+    self.data = np.frombuffer( self.map, dtype=np.uint8 )
+    self.source = rtester.Corpus_lines( self )
+    self.bsource = rtester.Corpus_lines( self, as_bytes=True )
+    self.rawlens = self.lengths
+    self.nlines = count
+    self.nbytes = len(self.map)
+    self.maxlen = int( self.lengths.max() ) if count else 0
+    self.n8bits = int( np.count_nonzero( self.data & 0x80 ) )
+    if verbose:
+      print('stress:', self.fname)
+      print('nbytes:', self.nbytes)
+      print('nlines:', self.nlines)
+      print('maxlen:', self.maxlen)
+      print('ttsend:', rtester.ttsend(self.nbytes, 115200))
+      print('n8bits:', self.n8bits)
+
+  def histogram(self, bins=16):
+    return np.histogram( self.rawlens, bins=bins )
+
+  def digest(self):
+    return hashlib.sha256( bytes(self.fname, 'latin_1') + self.map ).digest()
+
+def main(argv):
+  count = 1000
+  seed = 1
+  if len(argv) > 1: count = int(argv[1])
+  if len(argv) > 2: seed = int(argv[2])
+  # line rate at 115200 baud, for comparison
+  line_rate = 1.0 / rtester.ttsend(1, 115200)
+  print(f'{count} payloads per pattern, seed {seed}, line rate {line_rate/1e3:.1f} KB/s')
+  print(f'{"":10s} {"MB":>8s} {"sec":>8s} {"MB/sec":>8s} {"x line":>8s}')
+  for pattern in Stress.PATTERNS:
+    t0 = time.perf_counter()
+    data, offsets, lengths = Stress(pattern, seed).generate(count)
+    t = time.perf_counter() - t0
+    print(f'{pattern:10s} {len(data)/1e6:8.2f} {t:8.3f} {len(data)/1e6/t:8.1f} {len(data)/t/line_rate:8.0f}')
+
+if __name__ == "__main__":
+  main(sys.argv)
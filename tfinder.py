@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# Finds the fastest the link can be driven while keeping the error
+# rate under a target, by bisection over short probe bursts: the
+# smallest inter-packet delay in stop-and-wait, or the largest
+# window when pipelining. Each probe sends the next burst of
+# corpus lines, so the data differs from probe to probe. The
+# result is confirmed by a longer burst and reported in packets/s
+# and bytes/s against the ttsend() figure for the same bytes.
+#   ./tfinder.py [target_ppm] [delay|window]
+
+import sys
+import time
+import rtester
+
+class Probe:
+  # outcome of one burst
+  def __init__(self, tester, npackets, elapsed):
+    tally = tester.totals.run
+    self.npackets = npackets
+    self.elapsed = elapsed
+    self.all = tally.all.bytes
+    self.err = tally.err.bytes
+    self.wire_tx = tester.wire_tx
+    self.wire_rx = tester.wire_rx
+    self.ppm = 1.0e6 * self.err / self.all if self.all else 0.0
+  def passed(self, target):
+    return self.all > 0 and self.ppm <= target
+  def tideal(self, baud, window=0):
+    # Stop-and-wait sends and receives in turn, so the ideal time
+    # is that of all the wire bytes; a window overlaps the two
+    # directions and is bound by the busier one.
+    if window: return rtester.ttsend( max(self.wire_tx, self.wire_rx), baud )
+    return rtester.ttsend( self.wire_tx + self.wire_rx, baud )
+
+class Finder:
+  def __init__(self, tester, target=100.0, burst=500, baud=115200, vb=True):
+    self.tester = tester
+    self.target = target  # error ppm allowed
+    self.burst = burst    # packets per probe
+    self.baud = baud
+    self.vb = vb
+    self.beg = 0          # next corpus line to probe with
+
+  def probe(self, npackets, delay=0.0, window=0):
+    # a burst counted apart from the tester's own totals
+    tester = self.tester
+    saved = tester.totals, tester.wire_tx, tester.wire_rx
+    tester.totals = rtester.Totals()
+    tester.wire_tx = tester.wire_rx = 0
+    nlines = len(tester.source)
+    beg = self.beg
+    end = min( beg + npackets, nlines )
+    self.beg = end % nlines
+    t0 = time.monotonic()
+    if window: tester.run_window( window, beg=beg, end=end )
+    else: tester.run_stop_and_wait( delay, beg=beg, end=end )
+    result = Probe( tester, end-beg, time.monotonic() - t0 )
+    tester.totals, tester.wire_tx, tester.wire_rx = saved
+    if self.vb:
+      what = f'window {window:4d}' if window else f'delay {1e3*delay:7.3f} ms'
+      verdict = 'pass' if result.passed(self.target) else 'fail'
+      print(f'  {what}  {result.npackets:6d} pkts  {result.ppm:10.2f} ppm  {verdict}')
+    return result
+
+  def find_delay(self, hi=0.030, resolution=0.0002):
+    # smallest delay passing, None if even hi fails
+    if not self.probe( self.burst, delay=hi ).passed(self.target): return None
+    lo = 0.0
+    if self.probe( self.burst, delay=lo ).passed(self.target): return lo
+    while hi - lo > resolution:
+      mid = (lo + hi) / 2.0
+      if self.probe( self.burst, delay=mid ).passed(self.target): hi = mid
+      else: lo = mid
+    return hi
+
+  def find_window(self, hi=64):
+    # largest window passing, None if even one packet in flight fails
+    lo = 1
+    if not self.probe( self.burst, window=lo ).passed(self.target): return None
+    if self.probe( self.burst, window=hi ).passed(self.target): return hi
+    while hi - lo > 1:
+      mid = (lo + hi) // 2
+      if self.probe( self.burst, window=mid ).passed(self.target): lo = mid
+      else: hi = mid
+    return lo
+
+  def report(self, result, window=0):
+    tideal = result.tideal( self.baud, window )
+    t = result.elapsed
+    print(f'Sustainable.....> {result.npackets/t:10.1f} pkts/s {result.all/t:10.1f} payload bytes/s')
+    print(f'Wire............> {result.wire_tx/t:10.1f} tx B/s {result.wire_rx/t:10.1f} rx B/s')
+    print(f'ttsend..........> {result.npackets/tideal:10.1f} pkts/s {100.0*tideal/t:10.1f} % of ideal')
+    print(f'Error ppm.......> {result.ppm:10.2f}')
+
+def main(target=100.0, mode='delay', burst=500, codec='text', cksum=None, portname='/dev/ttyUSB0'):
+  c = rtester.Corpus()
+  p = rtester.Port(portname=portname)
+  link = rtester.Link(p)
+  logger = rtester.Logger('logfile.txt')
+  if not logger:
+    print('error opening logfile')
+    exit(99)
+  tester = rtester.Tester(link, c, logger, codec, cksum=cksum)
+  tester.verbose = False
+  finder = Finder(tester, target, burst, p.baud)
+
+  print(f'Searching for the fastest {mode} under {target} ppm, {burst} packets per probe')
+  if mode == 'window':
+    window = finder.find_window()
+    if window is None:
+      print('No window passes')
+      return None
+    print(f'Largest window {window}, confirming')
+    finder.report( finder.probe( 4*burst, window=window ), window )
+    setting = window
+  else:
+    delay = finder.find_delay()
+    if delay is None:
+      print('No delay passes')
+      return None
+    print(f'Smallest delay {1e3*delay:.3f} ms, confirming')
+    finder.report( finder.probe( 4*burst, delay=delay ) )
+    setting = delay
+  logger.close()
+  return setting
+
+if __name__ == "__main__":
+  target = 100.0
+  mode = 'delay'
+  if len(sys.argv) > 1: target = float(sys.argv[1])
+  if len(sys.argv) > 2: mode = sys.argv[2]
+  main(target, mode)
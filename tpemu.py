@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# A software Tarte-Py on a pseudo-terminal, for running rtester
+# and the benchmarks without the board. It opens a pty pair and
+# answers every packet written to the slave end the way the
+# firmware does, an echo and an ack/nak separated by RSEP, keeping
+# the checksum and sequence number of the packet, and honouring
+# PKMODE framing= and baud= settings.
+#
+# baud throttles the replies to what a link at that rate could
+# carry, each direction timed apart as on a real UART. Errors are
+# injected per reply at the given probabilities, from a seeded
+# generator so a run can be repeated:
+#   drop       no reply at all
+#   truncate   the echo cut short
+#   bitflip    one bit of the echo flipped
+# latency adds that many seconds to every reply, jitter up to that
+# many more at random. Acks carry the compact status, e.g.
+# 155555:1b,6,4,5,8, unless full_acks asks for the long form.
+#   ./tpemu.py [--baud N] [--drop P] [--truncate P] [--bitflip P]
+#              [--latency S] [--jitter S] [--seed N] [--full-acks]
+# then point rtester at the pty it prints, e.g.
+#   rtester.main( portname='/dev/pts/3' )
+
+import os
+import pty
+import tty
+import time
+import random
+import argparse
+import threading
+import upacket
+from rtester import ttsend
+
+class Emulator:
+  CHUNK_TIME = 0.002 # replies are paced in pieces this long on the wire
+  def __init__(self, baud=None, drop=0.0, truncate=0.0, bitflip=0.0,
+               latency=0.0, jitter=0.0, seed=1, vb=False, full_acks=False):
+    self.baud = baud
+    self.drop = drop
+    self.truncate = truncate
+    self.bitflip = bitflip
+    self.latency = latency
+    self.jitter = jitter
+    self.rng = random.Random(seed)
+    self.full_acks = full_acks
+    self.vb = vb
+    self.master, self.slave = pty.openpty()
+    tty.setraw( self.slave )
+    self.name = os.ttyname( self.slave )
+    self.use_framing( 'text' )
+    self.rx_free = 0.0 # when each direction of the
+    self.tx_free = 0.0 # simulated wire is next idle
+    self.counts = { 'packets': 0, 'drop': 0, 'truncate': 0, 'bitflip': 0 }
+    self.thread = None
+
+  def use_framing(self, name):
+    self.framing = upacket.FRAMINGS[name]
+    self.decoder = self.framing.decoder()
+
+  def start(self):
+    # serve from a daemon thread, for use inside a test program
+    self.thread = threading.Thread( target=self.serve, daemon=True )
+    self.thread.start()
+    return self
+
+  def serve(self):
+    while True:
+      try:
+        buff = os.read( self.master, 4096 )
+      except OSError:
+        return
+      if not buff: return
+      tarrive = time.monotonic()
+      for frame in self.decoder.feed(buff):
+        self.answer( frame, tarrive )
+
+  def reply(self, frame):
+    # the echo and ack/nak frames for one received frame, and the
+    # settings it asks for if it is a PKMODE packet
+    px = upacket.Packet_bytes()
+    status = px.parse(frame)
+    cksum = px.cksum.name if px.cksum is not None else None
+    echo = upacket.Packet_bytes( self.framing.wrap(bytes(frame)), 'pkecho', cksum, px.seq ).packet
+    text = status.serialize() if self.full_acks else status.serialize_compact()
+    ack = upacket.Packet_bytes( bytes(text, 'latin_1'), 'acknak', cksum, px.seq ).packet
+    settings = None
+    if status and px.ptype == 'PKMODE':
+      settings = upacket.mode_decode( bytes(px.payload).decode('latin_1') )
+    return echo, ack, settings
+
+  def damage(self, echo):
+    # injects at most one error into the echo, None to drop it all
+    roll = self.rng.random()
+    if roll < self.drop:
+      self.counts['drop'] += 1
+      return None
+    roll -= self.drop
+    if roll < self.truncate:
+      self.counts['truncate'] += 1
+      return echo[:self.rng.randrange(len(echo))]
+    roll -= self.truncate
+    if roll < self.bitflip:
+      self.counts['bitflip'] += 1
+      echo = bytearray(echo)
+      echo[self.rng.randrange(len(echo))] ^= 1 << self.rng.randrange(8)
+      return bytes(echo)
+    return echo
+
+  def answer(self, frame, tarrive):
+    self.counts['packets'] += 1
+    echo, ack, settings = self.reply(frame)
+    echo = self.damage(echo)
+    if echo is not None:
+      if self.framing.NAME == 'text':
+        out = echo + upacket.Packet_bytes.RSEP + ack
+      else:
+        out = self.framing.frame(echo) + self.framing.frame(ack)
+      self.send( out, len(frame), tarrive )
+    if settings is not None:
+      # answered in the old settings, the new ones apply after
+      if 'framing' in settings: self.use_framing( settings['framing'] )
+      if 'baud' in settings and self.baud is not None: self.baud = int(settings['baud'])
+      if self.vb: print('pkmode:', settings)
+
+  def send(self, out, nrecv, tarrive):
+    tready = tarrive + self.latency
+    if self.jitter: tready += self.rng.uniform(0.0, self.jitter)
+    if not self.baud:
+      self.wait( tready )
+      os.write( self.master, out )
+      return
+    # the frame was not all in before its last byte could arrive,
+    # and the reply waits for the wire to be free
+    self.rx_free = max( self.rx_free, tarrive ) + ttsend( nrecv, self.baud )
+    tready = max( tready, self.rx_free, self.tx_free )
+    self.tx_free = tready + ttsend( len(out), self.baud )
+    # written a piece at a time, each when its last byte would be out
+    chunk = max( 1, int( self.CHUNK_TIME / ttsend( 1, self.baud ) ) )
+    for k in range(0, len(out), chunk):
+      piece = out[k:k+chunk]
+      self.wait( tready + ttsend( k + len(piece), self.baud ) )
+      os.write( self.master, piece )
+
+  def wait(self, t):
+    delay = t - time.monotonic()
+    if delay > 0: time.sleep(delay)
+
+  def close(self):
+    os.close( self.master )
+    os.close( self.slave )
+
+def main():
+  parser = argparse.ArgumentParser( description='Tarte-Py emulator on a pty' )
+  parser.add_argument( '--baud', type=int, default=None, help='simulated baud rate, none to run flat out' )
+  parser.add_argument( '--drop', type=float, default=0.0, help='probability a reply is lost' )
+  parser.add_argument( '--truncate', type=float, default=0.0, help='probability an echo is cut short' )
+  parser.add_argument( '--bitflip', type=float, default=0.0, help='probability an echo has a bit flipped' )
+  parser.add_argument( '--latency', type=float, default=0.0, help='seconds added to every reply' )
+  parser.add_argument( '--jitter', type=float, default=0.0, help='up to this many seconds more at random' )
+  parser.add_argument( '--seed', type=int, default=1 )
+  parser.add_argument( '--full-acks', action='store_true', help='acks with the long status form' )
+  args = parser.parse_args()
+  emu = Emulator( args.baud, args.drop, args.truncate, args.bitflip,
+                  args.latency, args.jitter, args.seed, vb=True, full_acks=args.full_acks )
+  print(emu.name, flush=True)
+  try:
+    emu.serve()
+  except KeyboardInterrupt:
+    pass
+  print(emu.counts)
+  emu.close()
+
+if __name__ == "__main__":
+  main()
@@ -3,6 +3,7 @@
 import sys, gc
 import time
 import binascii
+from array import array
 
 # Micropython doesn't have .zfill(w) function
 # this replacement from their forums:
@@ -57,34 +58,174 @@ class Bool_confirmed:
   def __repr__(self):
     return self.__str__()
 
+class Checksum:
+  # A checksum engine: its name, the code marking it in the
+  # packet type ('' for crc32, the original and default), the
+  # width of the crc field in hex digits, and the function
+  # computing it over a bytes-like payload
+  def __init__(self, name, code, nibbles, func):
+    self.name = name
+    self.code = code
+    self.nibbles = nibbles
+    self.func = func
+  def __call__(self, data):
+    return self.func(data)
+  def __str__(self):
+    return self.name
+  def __repr__(self):
+    return self.__str__()
+
+# Table driven versions are pure python, for MicroPython
+# ports built without binascii.crc32 or zlib.adler32
+def crc_table_reflected(poly):
+  table = []
+  for i in range(256):
+    c = i
+    for k in range(8):
+      if c & 1: c = (c >> 1) ^ poly
+      else:     c = c >> 1
+    table.append(c)
+  return table
+
+def crc_table_msb(poly, width):
+  table = []
+  top = 1 << (width-1)
+  mask = (1 << width) - 1
+  for i in range(256):
+    c = i << (width-8)
+    for k in range(8):
+      if c & top: c = ((c << 1) ^ poly) & mask
+      else:       c = (c << 1) & mask
+    table.append(c)
+  return table
+
+CRC32_TABLE = crc_table_reflected(0xedb88320)
+CRC16_TABLE = crc_table_msb(0x1021, 16)
+
+def crc32_py(data, crc=0):
+  # same values as binascii.crc32
+  table = CRC32_TABLE
+  crc ^= 0xffffffff
+  for b in bytes(data):
+    crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+  return crc ^ 0xffffffff
+
+def crc16_py(data, crc=0xffff):
+  # CRC16-CCITT, poly 0x1021, init 0xffff (CCITT-FALSE)
+  table = CRC16_TABLE
+  for b in bytes(data):
+    crc = ((crc << 8) & 0xffff) ^ table[((crc >> 8) ^ b) & 0xff]
+  return crc
+
+def adler32_py(data):
+  a = 1
+  b = 0
+  data = bytes(data)
+  # 5552 is the most bytes that can be summed before b overflows 32 bits
+  for i in range(0, len(data), 5552):
+    for x in data[i:i+5552]:
+      a += x
+      b += a
+    a %= 65521
+    b %= 65521
+  return (b << 16) | a
+
+CHECKSUMS = {}      # by name
+CHECKSUM_CODES = {} # by code, the engine used to parse
+CHECKSUM_DEF = 'crc32'
+
+def register_checksum(engine):
+  # the engine registered last for a code is the one used
+  # to check packets marked with that code
+  CHECKSUMS[engine.name] = engine
+  CHECKSUM_CODES[engine.code] = engine
+
+register_checksum( Checksum('crc32_py', '', 8, crc32_py) )
+register_checksum( Checksum('crc16_py', 'c', 4, crc16_py) )
+register_checksum( Checksum('adler32_py', 'a', 8, adler32_py) )
+if hasattr(binascii, 'crc32'):
+  register_checksum( Checksum('crc32', '', 8, binascii.crc32) )
+else:
+  CHECKSUMS['crc32'] = CHECKSUM_CODES['']
+if hasattr(binascii, 'crc_hqx'):
+  register_checksum( Checksum('crc16', 'c', 4, lambda data: binascii.crc_hqx(data, 0xffff)) )
+else:
+  CHECKSUMS['crc16'] = CHECKSUM_CODES['c']
+try:
+  import zlib
+except ImportError:
+  zlib = None
+# MicroPython's zlib, where there is one, has no adler32
+if hasattr(zlib, 'adler32'):
+  register_checksum( Checksum('adler32', 'a', 8, zlib.adler32) )
+else:
+  CHECKSUMS['adler32'] = CHECKSUM_CODES['a']
+
 class Packet_type:
   # packet type will always contain valid string
   # flag self.unknown will be set, however, if an
   # invalid string was used to initialize the 
   # packet type
+  # The six character type can be followed by extensions,
+  # each a tag character and a fixed width value:
+  #   %c      checksum code, see CHECKSUM_CODES (crc32 has none)
+  #   #hhhh   sequence number, four hex digits
   PTYPE_DEF = 'pksend'
   PTYPES = { 'pksend': 'PKSEND', 
              'pkecho': 'PKECHO', 
              'acknak': 'ACKNAK',
+             'pkmode': 'PKMODE',
           }
-  def __init__(self, stype=None):
+  PTYPE_LEN = 6
+  EXTS = { '%': 1, '#': 4 }
+  SEQ_MOD = 0x10000
+  def __init__(self, stype=None, cksum=None, seq=None):
     self.set_ptype(stype)
+    if cksum is not None: self.cksum = cksum
+    if seq is not None: self.seq = seq % self.SEQ_MOD
   def __eq__(a,b):
-    return a.ptype == b.ptype
+    return a.ptype == b.ptype and a.cksum == b.cksum and a.seq == b.seq
   def __str__(self):
-    return '{}'.format(self.ptype)
+    return '{}{}'.format(self.ptype, self.exts())
   def __repr__(self):
     return self.__str__()
   def validate(self, stype):
     return stype.lower() in self.PTYPES
   def set_ptype(self, stype=None):
     if stype is None: stype = self.PTYPE_DEF
-    if self.validate(stype):
+    self.cksum = ''
+    self.seq = None
+    base = stype[:self.PTYPE_LEN]
+    if self.validate(base) and self.set_exts(stype[self.PTYPE_LEN:]):
       self.unknown = False
-      self.ptype = self.PTYPES[stype.lower()]
+      self.ptype = self.PTYPES[base.lower()]
     else:
       self.unknown = True
+      self.cksum = ''
+      self.seq = None
       self.ptype = self.PTYPES[self.PTYPE_DEF]
+  def set_exts(self, text):
+    i = 0
+    while i < len(text):
+      size = self.EXTS.get(text[i])
+      if size is None or i+1+size > len(text): return False
+      tag = text[i]
+      value = text[i+1:i+1+size]
+      if tag == '%':
+        if value not in CHECKSUM_CODES: return False
+        self.cksum = value
+      elif tag == '#':
+        if not Hex_value.check_hex(value): return False
+        self.seq = int(value, 16)
+      i += 1+size
+    return True
+  def exts(self):
+    text = ''
+    if self.cksum: text += '%' + self.cksum
+    if self.seq is not None: text += '#' + zfill(hex(self.seq)[2:], 4)
+    return text
+  def checksum(self):
+    return CHECKSUM_CODES[self.cksum]
 
 class Hex_value:
   # size is nibbles, not bytes
@@ -146,43 +287,123 @@ class Hex_value:
   def __int__(self):
     return self.ival
 
+class Status_flag(Bool_confirmed):
+  # Bool_confirmed view onto one of the two-bit flags packed
+  # inside a Parsing_status, reading and writing it in place
+  def __init__(self, status, index):
+    self.status = status
+    self.index = index
+  @property
+  def flag(self):
+    return self.status.get_flag(self.index)
+  @flag.setter
+  def flag(self, value):
+    self.status.set_flag(self.index, value)
+
+def status_flag_property(index):
+  def fget(self):
+    return Status_flag(self, index)
+  def fset(self, value):
+    if isinstance(value, Bool_confirmed): self.set_flag(index, value.flag)
+    else: self.set_bool(index, value)
+  return property(fget, fset)
+
+def status_length_property(index):
+  def fget(self):
+    return self.lengths[index]
+  def fset(self, value):
+    self.lengths[index] = int(value)
+  return property(fget, fset)
+
 class Parsing_status:
+  # The eleven checks are Bool_confirmed flags, two bits each,
+  # packed into a single int, and the five lengths sit in one
+  # fixed array, so a parse allocates two objects, not a dozen.
+  # Attributes such as status.sync still read as Bool_confirmed
+  # (a view made on access), while parsing itself goes through
+  # set_bool() and check().
+  SYNC = 0
+  CHRET = 1
+  FIELDS = 2
+  SIZE_PACKET = 3
+  SIZE_SIZE = 4
+  SIZE_CRC = 5
+  SIZE_PAYLOAD = 6
+  HEX_SIZE = 7
+  HEX_CRC = 8
+  CRC = 9
+  VALID = 10
+  NFLAGS = 11
+  NCHECKS = 10 # all but valid
+  LEN_PACKET = 0
+  LEN_SYNC = 1
+  LEN_SIZE = 2
+  LEN_PAYLOAD = 3
+  LEN_CRC = 4
+  NLENGTHS = 5
+  FLAG_CHARS = ''.join( Bool_confirmed.BSTRING ).lower()
+
+  @classmethod
+  def mask(cls, indexes):
+    # pattern of TRUE flags to test against with check()
+    m = 0
+    for i in indexes:
+      m |= Bool_confirmed.TRUE << (2*i)
+    return m
+
   def __init__(self):
     self.init_bools()
     self.set_lengths()
+    # crc width the packet's checksum engine expects, set by the
+    # parsers once the sync field is read (0 until then, and after
+    # unserialize, as neither wire form carries it)
+    self.crc_nibbles = 0
   def init_bools(self):
     # initialized all to unknown
-    self.sync = Bool_confirmed()
-    self.chret = Bool_confirmed()
-    self.fields = Bool_confirmed()
-    self.size_packet = Bool_confirmed()
-    self.size_size = Bool_confirmed()
-    self.size_crc = Bool_confirmed()
-    self.size_payload = Bool_confirmed()
-    self.hex_size = Bool_confirmed()
-    self.hex_crc = Bool_confirmed()
-    self.crc = Bool_confirmed()
-    self.valid = Bool_confirmed()
+    self.flags = 0
   def set_lengths( self, lpacket=0, lsync=0, lsize=0, lpayload=0, lcrc=0 ):
-    self.len_packet = lpacket
-    self.len_sync = lsync
-    self.len_size = lsize
-    self.len_payload = lpayload
-    self.len_crc = lcrc
+    self.lengths = array('L', [ lpacket, lsync, lsize, lpayload, lcrc ])
+
+  def get_flag(self, index):
+    return (self.flags >> (2*index)) & 3
+  def set_flag(self, index, flag):
+    if flag < Bool_confirmed.MIN or flag > Bool_confirmed.MAX:
+      flag = Bool_confirmed.ERROR
+    shift = 2*index
+    self.flags = (self.flags & ~(3 << shift)) | (flag << shift)
+  def set_bool(self, index, value):
+    shift = 2*index
+    if value: flag = Bool_confirmed.TRUE
+    else:     flag = Bool_confirmed.FALSE
+    self.flags = (self.flags & ~(3 << shift)) | (flag << shift)
+  def is_true(self, index):
+    return self.get_flag(index) == Bool_confirmed.TRUE
+  def check(self, mask):
+    # every flag in the mask (see mask()) is TRUE
+    return self.flags & (3*mask) == mask
+
+  sync = status_flag_property(SYNC)
+  chret = status_flag_property(CHRET)
+  fields = status_flag_property(FIELDS)
+  size_packet = status_flag_property(SIZE_PACKET)
+  size_size = status_flag_property(SIZE_SIZE)
+  size_crc = status_flag_property(SIZE_CRC)
+  size_payload = status_flag_property(SIZE_PAYLOAD)
+  hex_size = status_flag_property(HEX_SIZE)
+  hex_crc = status_flag_property(HEX_CRC)
+  crc = status_flag_property(CRC)
+  valid = status_flag_property(VALID)
+  len_packet = status_length_property(LEN_PACKET)
+  len_sync = status_length_property(LEN_SYNC)
+  len_size = status_length_property(LEN_SIZE)
+  len_payload = status_length_property(LEN_PAYLOAD)
+  len_crc = status_length_property(LEN_CRC)
+
   def __bool__(self):
-    return all( [
-      self.sync, 
-      self.chret, 
-      self.fields, 
-      self.size_packet, 
-      self.size_size, 
-      self.size_crc, 
-      self.size_payload, 
-      self.hex_size, 
-      self.hex_crc, 
-      self.crc, 
-      ] )
+    return self.check(self.ALL)
   def __str__(self):
+    if self.crc_nibbles: crc_width = '{} bytes'.format( self.crc_nibbles )
+    else: crc_width = 'the checksum width'
     return \
       '\nlen of packet.....>  {}  bytes'.format( self.len_packet ) +\
       '\nlen of sync.......>  {}  bytes'.format( self.len_sync ) +\
@@ -192,9 +413,9 @@ class Parsing_status:
       '\nsync..............>  {}  sync pattern must be PACKET'.format( self.sync ) +\
       '\nchret.............>  {}  packet must end with CR'.format( self.chret ) +\
       '\nfields............>  {}  must be three unit separators'.format( self.fields ) +\
-      '\nsize of packet....>  {}  must be 22 bytes or larger'.format( self.size_packet ) +\
+      '\nsize of packet....>  {}  must be {} bytes or larger'.format( self.size_packet, Packet.MINSIZE ) +\
       '\nsize of size......>  {}  must be four bytes'.format( self.size_size ) +\
-      '\nsize of crc.......>  {}  must be eight bytes'.format( self.size_crc ) +\
+      '\nsize of crc.......>  {}  must be {}'.format( self.size_crc, crc_width ) +\
       '\nsize of payload...>  {}  must agree with size in packet'.format( self.size_payload ) +\
       '\nsize valid hex....>  {}  contains valid hexadecimal characters'.format( self.hex_size ) +\
       '\ncrc valid hex.....>  {}  contains valid hexadecimal characters'.format( self.hex_crc ) +\
@@ -206,13 +427,19 @@ class Parsing_status:
       '{},{},{},{},{};'.format( \
           self.len_packet, self.len_sync, self.len_size,\
           self.len_payload, self.len_crc ) + \
-      '{},{},{},{},{},{},{},{},{},{}'.format( 
-          self.sync, self.chret, self.fields,
-          self.size_packet, self.size_size, self.size_crc,
-          self.size_payload, self.hex_size, self.hex_crc,
-          self.crc )
+      ','.join( [ Bool_confirmed.BSTRING[self.get_flag(i)] \
+                  for i in range(self.NCHECKS) ] )
+  def serialize_compact(self):
+    # flags as six hex digits, then the lengths in hex:
+    #   155555:1b,6,4,5,8
+    return zfill( hex(self.flags)[2:], 6 ) + ':' + \
+           ','.join( [ hex(n)[2:] for n in self.lengths ] )
   def unserialize(self, text):
-    parts = text.strip().split(';')
+    # accepts both serialize() and serialize_compact() forms
+    text = text.strip()
+    if ':' in text:
+      return self.unserialize_compact(text)
+    parts = text.split(';')
     if len(parts) != 2: 
       self.init_bools()
       self.set_lengths()
@@ -227,22 +454,45 @@ class Parsing_status:
       self.init_bools()
       self.set_lengths()
       return False
-    self.len_packet   = nums[0]
-    self.len_sync     = nums[1]
-    self.len_size     = nums[2]
-    self.len_payload  = nums[3]
-    self.len_crc      = nums[4]
-    self.sync.from_string(         flags[0] )
-    self.chret.from_string(        flags[1] )
-    self.fields.from_string(       flags[2] )
-    self.size_packet.from_string(  flags[3] )
-    self.size_size.from_string(    flags[4] )
-    self.size_crc.from_string(     flags[5] )
-    self.size_payload.from_string( flags[6] )
-    self.hex_size.from_string(     flags[7] )
-    self.hex_crc.from_string(      flags[8] )
-    self.crc.from_string(          flags[9] )
+    try:
+      # a negative or huge length overflows the array
+      self.set_lengths( *[ int(n) for n in nums ] )
+    except (ValueError, OverflowError):
+      self.init_bools()
+      self.set_lengths()
+      return False
+    # as Bool_confirmed.from_string(), straight into the flags:
+    # the first letter of each, '' unknown, anything else an error
+    bits = 0
+    for i in range(self.NCHECKS):
+      flag = self.FLAG_CHARS.find( flags[i][:1].lower() )
+      if flag < 0: flag = Bool_confirmed.ERROR
+      bits |= flag << (2*i)
+    self.flags = bits
     return True
+  def unserialize_compact(self, text):
+    parts = text.strip().split(':')
+    nums = parts[-1].split(',')
+    # check_hex() passes empty fields, int() does not
+    if len(parts) != 2 or len(nums) != 5 \
+       or not all( [ n and Hex_value.check_hex(n) for n in parts[:1] + nums ] ):
+      self.init_bools()
+      self.set_lengths()
+      return False
+    try:
+      self.set_lengths( *[ int(n, 16) for n in nums ] )
+    except OverflowError:
+      self.init_bools()
+      self.set_lengths()
+      return False
+    self.flags = int(parts[0], 16) & ((1 << 2*self.NFLAGS) - 1)
+    return True
+
+Parsing_status.ALL = Parsing_status.mask( range(Parsing_status.NCHECKS) )
+Parsing_status.HEADER = Parsing_status.mask( [
+    Parsing_status.CHRET, Parsing_status.SYNC,
+    Parsing_status.SIZE_SIZE, Parsing_status.SIZE_CRC,
+    Parsing_status.HEX_SIZE, Parsing_status.HEX_CRC ] )
 
 class Packet:
   # Packet:
@@ -254,12 +504,14 @@ class Packet:
   #   4   US characters 3 + cr 1 
   #  22 + x  Total Packet Size
   OVERHEAD = 22
+  # smallest possible packet, crc16 and its '%c' tag, no payload
+  MINSIZE = 20
   USEP = '\x1f'
   RSEP = '\x1e'
-  def __init__(self, payload='', stype=None):
-    self.asc = Ascii()
+  def __init__(self, payload='', stype=None, cksum=None, seq=None):
+    self.asc = Ascii.shared()
     self.vb=False # verbosity
-    self.generate(payload, stype)
+    self.generate(payload, stype, cksum, seq)
   def __eq__(a,b):
     return a.sync == b.sync and \
            a.payload == b.payload and \
@@ -280,28 +532,32 @@ class Packet:
   def reset(self):
     self.generate()
 
-  def generate(self, payload='', stype=None):
-    self.sync = Packet_type(stype)
+  def generate(self, payload='', stype=None, cksum=None, seq=None):
+    # cksum is the name of a checksum engine, see CHECKSUMS,
+    # seq an optional sequence number
+    if cksum is None: cksum = CHECKSUM_DEF
+    self.cksum = CHECKSUMS[cksum]
+    self.sync = Packet_type(stype, self.cksum.code, seq)
     self.payload = payload
     self.size = Hex_value(len(self.payload), size=4)
-    crc = binascii.crc32(bytes(self.payload,'latin_1'))
-    self.crc = Hex_value( crc, size=8)
+    crc = self.cksum(bytes(self.payload,'latin_1'))
+    self.crc = Hex_value( crc, size=self.cksum.nibbles)
     self.build()
 
   def parse(self, packet):
     status = Parsing_status()
     pktsize = len(packet)
     status.len_packet = pktsize
-    status.size_packet.from_bool( pktsize >= self.OVERHEAD )
+    status.set_bool( status.SIZE_PACKET, pktsize >= self.MINSIZE )
     if self.vb: print('packet size:', pktsize)
-    if status.size_packet:
-      status.chret.from_bool( packet.endswith('\r') )
+    if status.is_true( status.SIZE_PACKET ):
+      status.set_bool( status.CHRET, packet.endswith('\r') )
       if self.vb: print('ends with CR:', status.chret)
       fields = packet.strip().split(self.USEP)
       num_fields = len(fields)
-      status.fields.from_bool( num_fields == 4 )
+      status.set_bool( status.FIELDS, num_fields == 4 )
       if self.vb: print('number of fields:', num_fields)
-      if status.fields:
+      if status.is_true( status.FIELDS ):
         if self.vb: print('fields0.sync:', fields[0])
         if self.vb: print('fields1.size:', fields[1])
         if self.vb: print('fields2.payl:', fields[2])
@@ -310,15 +566,17 @@ class Packet:
         status.len_size = len(fields[1])
         status.len_payload = len(fields[2])
         status.len_crc = len(fields[3])
-        status.size_size.from_bool( len(fields[1]) == 4 )
-        status.size_crc.from_bool( len(fields[3]) == 8 )
-        status.hex_size.from_bool( Hex_value.check_hex(fields[1]) )
-        status.hex_crc.from_bool( Hex_value.check_hex(fields[3]) )
         sync = Packet_type( fields[0] )
-        status.sync.from_bool( not sync.unknown )
+        cksum = sync.checksum()
+        status.crc_nibbles = cksum.nibbles
+        status.set_bool( status.SIZE_SIZE, len(fields[1]) == 4 )
+        status.set_bool( status.SIZE_CRC, len(fields[3]) == cksum.nibbles )
+        status.set_bool( status.HEX_SIZE, Hex_value.check_hex(fields[1]) )
+        status.set_bool( status.HEX_CRC, Hex_value.check_hex(fields[3]) )
+        status.set_bool( status.SYNC, not sync.unknown )
         size = Hex_value(fields[1], size=4)
         payload = fields[2]
-        crc = Hex_value(fields[3], size=8)
+        crc = Hex_value(fields[3], size=cksum.nibbles)
         if self.vb: print('sync:', sync)
         if self.vb: print('size:', size)
         if self.vb: print('payl:', payload)
@@ -327,26 +585,23 @@ class Packet:
         if self.vb: print('stat.size_crc:', status.size_crc)
         if self.vb: print('stat.hex_size:', status.hex_size)
         if self.vb: print('stat.hex_crc:', status.hex_crc)
-        if all([ 
-            status.chret, status.sync, 
-            status.size_size, status.size_crc,
-            status.hex_size, status.hex_crc 
-        ] ):
+        if status.check( status.HEADER ):
           if self.vb: print('all okay')
-          status.size_payload.from_bool( len(payload) == size.ival )
+          status.set_bool( status.SIZE_PAYLOAD, len(payload) == size.ival )
           if self.vb: print('stat.size_payload:', status.size_payload )
-          if status.size_payload:
-            crc_calc = Hex_value( binascii.crc32(bytes(payload,'latin_1')), size=8 )
+          if status.is_true( status.SIZE_PAYLOAD ):
+            crc_calc = Hex_value( cksum(bytes(payload,'latin_1')), size=cksum.nibbles )
             if self.vb: print('crc_calc:', crc_calc)
-            status.crc.from_bool( crc == crc_calc )
+            status.set_bool( status.CRC, crc == crc_calc )
             if self.vb: print('stat.crc:', status.crc )
-            if status.crc:
+            if status.is_true( status.CRC ):
               if self.vb: print('finally!!!!')
               if self.vb: print('sync:', sync)
               if self.vb: print('size:', size)
               if self.vb: print('payload:', payload)
               if self.vb: print('crc:', crc)
               self.sync = sync
+              self.cksum = cksum
               self.size = size
               self.payload = payload
               self.crc = crc
@@ -365,6 +620,407 @@ class Packet:
     return text.replace( '{US}', cls.USEP ).replace('{CR}', '\r' )
 
 
+class Packet_bytes:
+  # Same wire format as Packet, but built and parsed directly
+  # on bytes / bytearray / memoryview, never going through str.
+  #   size and crc are plain ints, cksum the Checksum engine,
+  #   seq the sequence number or None
+  #   sync is the wire bytes, extensions included,
+  #   ptype the Packet_type string
+  #   payload is kept as given, or after parse() as a memoryview
+  #   slice of the received buffer, and the crc is computed over
+  #   that slice in place
+  # Keep the received buffer alive as long as the payload is used.
+  OVERHEAD = Packet.OVERHEAD
+  MINSIZE = Packet.MINSIZE
+  USEP = b'\x1f'
+  RSEP = b'\x1e'
+  CR = b'\r'
+  WHITESPACE = b' \t\n\r\x0b\x0c'
+  HEXDIGITS = b'0123456789abcdefABCDEF'
+  # sync and size fields are short, so the field separators
+  # are searched for in small windows at each end of the packet
+  WINDOW = 32
+  SYNCS = {}
+  for _stype in Packet_type.PTYPES:
+    SYNCS[bytes(_stype, 'latin_1')] = bytes(Packet_type.PTYPES[_stype], 'latin_1')
+  del _stype
+
+  def __init__(self, payload=b'', stype=None, cksum=None, seq=None):
+    self.asc = Ascii.shared()
+    self.vb=False # verbosity
+    self.generate(payload, stype, cksum, seq)
+  def __eq__(a,b):
+    return a.sync == b.sync and \
+           a.size == b.size and \
+           a.crc == b.crc and \
+           a.payload == b.payload
+  def __str__(self):
+    return '{} / {} / {} / {}'.format(
+        self.sync.decode('latin_1'), zfill(hex(self.size)[2:], 4),
+        self.asc.pretty(bytes(self.payload).decode('latin_1')),
+        zfill(hex(self.crc)[2:], self.cksum.nibbles) )
+  def __repr__(self):
+    return self.__str__()
+  def raw(self):
+    return self.packet
+
+  @classmethod
+  def check_hex(cls, data):
+    # a loop like Hex_value.check_hex(), MicroPython
+    # has no bytes.translate()
+    hexdigits = cls.HEXDIGITS
+    for b in data:
+      if b not in hexdigits:
+        return False
+    return True
+
+  @classmethod
+  def hex_field(cls, value, size):
+    # same rules as Hex_value: out of range values become zero
+    if value < 0 or value >= pow(2, size*4): value = 0
+    return bytes(zfill(hex(value)[2:], size), 'latin_1')
+
+  def build(self):
+    self.packet = b''.join( [
+        self.sync, self.USEP,
+        self.hex_field(self.size, 4), self.USEP,
+        self.payload, self.USEP,
+        self.hex_field(self.crc, self.cksum.nibbles), self.CR ] )
+
+  def reset(self):
+    self.generate()
+
+  def generate(self, payload=b'', stype=None, cksum=None, seq=None):
+    # cksum is the name of a checksum engine, see CHECKSUMS,
+    # seq an optional sequence number
+    if stype is None: stype = Packet_type.PTYPE_DEF
+    if cksum is None: cksum = CHECKSUM_DEF
+    sync = self.SYNCS.get(bytes(stype, 'latin_1').lower())
+    if sync is None:
+      sync = self.SYNCS[bytes(Packet_type.PTYPE_DEF, 'latin_1')]
+    self.ptype = sync.decode('latin_1')
+    self.cksum = CHECKSUMS[cksum]
+    self.seq = None
+    if self.cksum.code or seq is not None:
+      pt = Packet_type(stype, self.cksum.code, seq)
+      self.seq = pt.seq
+      sync = sync + bytes(pt.exts(), 'latin_1')
+    self.sync = sync
+    self.payload = payload
+    self.size = len(payload)
+    if self.size >= 0x10000: self.size = 0
+    self.crc = self.cksum(payload)
+    self.build()
+
+  @classmethod
+  def split_sync(cls, fsync):
+    # (sync, Checksum, seq) for a sync field, extensions
+    # included; sync is None if the field is not valid
+    sync = cls.SYNCS.get(fsync[:Packet_type.PTYPE_LEN].lower())
+    if sync is None: return None, CHECKSUM_CODES[''], None
+    if len(fsync) == Packet_type.PTYPE_LEN: return sync, CHECKSUM_CODES[''], None
+    pt = Packet_type(fsync.decode('latin_1'))
+    if pt.unknown: return None, CHECKSUM_CODES[''], None
+    return fsync, pt.checksum(), pt.seq
+
+  def parse(self, data):
+    status = Parsing_status()
+    mv = memoryview(data)
+    pktsize = len(mv)
+    status.len_packet = pktsize
+    status.set_bool( status.SIZE_PACKET, pktsize >= self.MINSIZE )
+    if self.vb: print('packet size:', pktsize)
+    if status.is_true( status.SIZE_PACKET ):
+      status.set_bool( status.CHRET, mv[-1] == self.CR[0] )
+      if self.vb: print('ends with CR:', status.chret)
+      # strip surrounding whitespace, as Packet.parse() does
+      beg = 0
+      end = pktsize
+      while end > beg and mv[end-1] in self.WHITESPACE: end -= 1
+      while beg < end and mv[beg] in self.WHITESPACE: beg += 1
+      head = bytes(mv[beg:min(end, beg+self.WINDOW)])
+      tail = bytes(mv[max(beg, end-self.WINDOW):end])
+      i1 = head.find(self.USEP)
+      i2 = head.find(self.USEP, i1+1) if i1 >= 0 else -1
+      i3 = tail.rfind(self.USEP)
+      if i3 >= 0: i3 += end - len(tail) - beg
+      # Unlike Packet.parse(), a USEP inside the payload is not
+      # a framing error: the payload is bounded by the size field
+      # and the crc, which still have to agree.
+      status.set_bool( status.FIELDS, i1 >= 0 and i2 >= 0 and i3 > i2 )
+      if self.vb: print('fields found:', status.fields)
+      if status.is_true( status.FIELDS ):
+        fsync = head[:i1]
+        fsize = head[i1+1:i2]
+        fcrc = bytes(mv[beg+i3+1:end])
+        pbeg = beg+i2+1
+        pend = beg+i3
+        status.len_sync = len(fsync)
+        status.len_size = len(fsize)
+        status.len_payload = pend - pbeg
+        status.len_crc = len(fcrc)
+        sync, cksum, seq = self.split_sync(fsync)
+        status.crc_nibbles = cksum.nibbles
+        status.set_bool( status.SIZE_SIZE, len(fsize) == 4 )
+        status.set_bool( status.SIZE_CRC, len(fcrc) == cksum.nibbles )
+        status.set_bool( status.HEX_SIZE, self.check_hex(fsize) )
+        status.set_bool( status.HEX_CRC, self.check_hex(fcrc) )
+        status.set_bool( status.SYNC, sync is not None )
+        if self.vb: print('fields:', fsync, fsize, pend-pbeg, fcrc)
+        if status.check( status.HEADER ):
+          size = int(fsize, 16)
+          status.set_bool( status.SIZE_PAYLOAD, pend-pbeg == size )
+          if self.vb: print('stat.size_payload:', status.size_payload )
+          if status.is_true( status.SIZE_PAYLOAD ):
+            payload = mv[pbeg:pend]
+            crc = int(fcrc, 16)
+            status.set_bool( status.CRC, crc == cksum(payload) )
+            if self.vb: print('stat.crc:', status.crc )
+            if status.is_true( status.CRC ):
+              self.sync = sync
+              self.ptype = sync[:Packet_type.PTYPE_LEN].decode('latin_1')
+              self.cksum = cksum
+              self.seq = seq
+              self.size = size
+              self.payload = payload
+              self.crc = crc
+              if beg == 0 and end == pktsize-1:
+                self.packet = mv
+              else:
+                self.build()
+    if not status:
+      self.reset()
+
+    return status
+
+  @classmethod
+  def serialize(cls, data):
+    return bytes(data).replace(cls.USEP, b'{US}').replace(cls.CR, b'{CR}')
+
+  @classmethod
+  def unserialize(cls, data):
+    return bytes(data).replace(b'{US}', cls.USEP).replace(b'{CR}', cls.CR)
+
+
+class Frame_decoder:
+  # Incremental splitter for the replies coming back from the
+  # Tarte-Py, the echo frame and the ack/nak frame separated
+  # by RSEP:
+  #   PKECHO ... \r RSEP ACKNAK ... \r
+  # Bytes are fed in chunks of any size as they arrive, partial
+  # frames are kept between calls, and each frame is returned
+  # (as bytes) the moment it is complete. A frame ends at an
+  # RSEP, or once it holds as many bytes as its own size field
+  # calls for, since the last frame has no RSEP after it.
+  # An RSEP inside a payload would end the frame early, same
+  # as the old split(RSEP) did.
+  RSEP = Packet_bytes.RSEP[0]
+  USEP = Packet_bytes.USEP[0]
+  WINDOW = Packet_bytes.WINDOW
+  OVERHEAD = Packet_bytes.OVERHEAD
+  # garbage without any RSEP is given up as a frame at this size
+  MAXLEN = 0x10000 + 2*Packet_bytes.OVERHEAD
+
+  def __init__(self, maxlen=None):
+    if maxlen is None: maxlen = self.MAXLEN
+    self.maxlen = maxlen
+    self.reset()
+
+  def reset(self):
+    self.buff = bytearray()
+    self.need = None  # length of frame in progress, 0 if unknowable
+    self.skip = False # drop an RSEP right after a frame ended by length
+
+  def pending(self):
+    return len(self.buff)
+
+  def frame_length(self):
+    # expected total frame length from the header, None if
+    # more bytes are needed to tell, 0 if the header is bad
+    buff = self.buff
+    i1 = buff.find(self.USEP, 0, self.WINDOW)
+    if i1 < 0:
+      if len(buff) >= self.WINDOW: return 0
+      return None
+    if len(buff) < i1+6: return None
+    fsize = bytes(buff[i1+1:i1+5])
+    if buff[i1+5] != self.USEP or not Packet_bytes.check_hex(fsize):
+      return 0
+    sync, cksum, seq = Packet_bytes.split_sync(bytes(buff[:i1]))
+    if sync is None: return 0
+    # sync, size, payload, crc, three USEPs and CR
+    return i1 + 4 + int(fsize, 16) + cksum.nibbles + 4
+
+  def next_frame(self):
+    buff = self.buff
+    if self.skip and len(buff) > 0:
+      if buff[0] == self.RSEP: del buff[:1]
+      self.skip = False
+    if len(buff) == 0: return None
+    if self.need is None:
+      self.need = self.frame_length()
+    limit = len(buff)
+    if self.need: limit = min(limit, self.need)
+    i = buff.find(self.RSEP, 0, limit)
+    if i >= 0:
+      frame = bytes(buff[:i])
+      del buff[:i+1]
+      self.need = None
+      return frame
+    if self.need and len(buff) >= self.need:
+      frame = bytes(buff[:self.need])
+      del buff[:self.need]
+      self.need = None
+      self.skip = True
+      return frame
+    if len(buff) >= self.maxlen:
+      return self.flush()
+    return None
+
+  def feed(self, chunk):
+    self.buff.extend(chunk)
+    frames = []
+    while True:
+      frame = self.next_frame()
+      if frame is None: break
+      frames.append(frame)
+    return frames
+
+  def flush(self):
+    # give up on the frame in progress, returning what
+    # there is of it, or None if nothing was pending
+    frame = None
+    if len(self.buff) > 0:
+      frame = bytes(self.buff)
+    self.reset()
+    return frame
+
+
+def cobs_encode(data):
+  # Consistent overhead byte stuffing: the result has no 0x00
+  # bytes and is at most 1 + len/254 bytes longer than the data
+  out = bytearray()
+  for block in bytes(data).split(b'\x00'):
+    while len(block) >= 0xfe:
+      out.append(0xff)
+      out += block[:0xfe]
+      block = block[0xfe:]
+    out.append(len(block)+1)
+    out += block
+  return bytes(out)
+
+def cobs_decode(data):
+  # None if the data is not valid COBS
+  data = bytes(data)
+  out = bytearray()
+  n = len(data)
+  i = 0
+  while i < n:
+    code = data[i]
+    if code == 0 or i+code > n: return None
+    out += data[i+1:i+code]
+    i += code
+    if code < 0xff and i < n: out.append(0)
+  return bytes(out)
+
+class Cobs_decoder:
+  # Same job as Frame_decoder for the binary framing,
+  # where every frame is COBS encoded and ends with 0x00.
+  # A frame that does not decode is returned as received.
+  DELIM = 0
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.buff = bytearray()
+
+  def pending(self):
+    return len(self.buff)
+
+  def feed(self, chunk):
+    self.buff.extend(chunk)
+    frames = []
+    while True:
+      i = self.buff.find(self.DELIM)
+      if i < 0: break
+      if i > 0:
+        frame = cobs_decode(self.buff[:i])
+        if frame is None: frame = bytes(self.buff[:i])
+        frames.append(frame)
+      del self.buff[:i+1]
+    return frames
+
+  def flush(self):
+    frame = None
+    if len(self.buff) > 0:
+      frame = bytes(self.buff)
+    self.reset()
+    return frame
+
+class Framing_text:
+  # The original framing. Frames go out as they are and the
+  # replies are separated by RSEP. The echo carries the packet
+  # serialize()d, {US} and {CR} standing in for USEP and CR.
+  NAME = 'text'
+  @classmethod
+  def frame(cls, packet):
+    return packet
+  @classmethod
+  def wrap(cls, packet):
+    # payload of the echo for this packet
+    if isinstance(packet, str): return Packet.serialize(packet)
+    return Packet_bytes.serialize(packet)
+  @classmethod
+  def unwrap(cls, payload):
+    # the original packet back out of the echo payload
+    if isinstance(payload, str): return Packet.unserialize(payload)
+    return Packet_bytes.unserialize(payload)
+  @classmethod
+  def decoder(cls):
+    return Frame_decoder()
+
+class Framing_cobs:
+  # Binary framing. Every frame is COBS encoded and ends with a
+  # 0x00 byte, and the echo carries the packet verbatim, so the
+  # echo is no bigger than the packet plus its own overhead.
+  # Needs the bytes codec, Packet_bytes, on both ends.
+  NAME = 'cobs'
+  DELIM = b'\x00'
+  @classmethod
+  def frame(cls, packet):
+    return cobs_encode(packet) + cls.DELIM
+  @classmethod
+  def wrap(cls, packet):
+    return packet
+  @classmethod
+  def unwrap(cls, payload):
+    return payload
+  @classmethod
+  def decoder(cls):
+    return Cobs_decoder()
+
+FRAMINGS = { Framing_text.NAME: Framing_text,
+             Framing_cobs.NAME: Framing_cobs,
+           }
+
+# PKMODE packets ask the other end to change a setting, with
+# a payload such as 'framing=cobs'. They are answered like any
+# other packet, in the old settings, and the new ones apply
+# from the next packet on.
+def mode_encode(settings):
+  return ','.join( [ '{}={}'.format(k, settings[k]) for k in settings ] )
+
+def mode_decode(text):
+  settings = {}
+  for item in text.split(','):
+    if '=' in item:
+      k, v = item.split('=', 1)
+      settings[k.strip()] = v.strip()
+  return settings
+
+
 def testme(message='hello'):
   #message = 'hello'
   #if True:
@@ -430,48 +1086,147 @@ class Code_point:
   def __repr__(self):
     return self.__str__()
 
+def data_path(fname):
+  # data files live next to this module,
+  # so the working directory does not matter
+  try:
+    here = __file__
+  except NameError:
+    return fname
+  i = here.rfind('/')
+  if i < 0: return fname
+  return here[:i+1] + fname
+
+def load_codes():
+  # Code points from the baked ascii_codes module if there is
+  # one, else parsed from the text files
+  try:
+    import ascii_codes
+    return tuple( [ Code_point(*cp) for cp in ascii_codes.CODES ] )
+  except ImportError:
+    return parse_codes()
+
+def parse_codes():
+  # Code points from ascii-table.txt and ascii-tweaks.txt
+
+  #=== Initialize table of ASCII characters
+  fp = open( data_path('ascii-table.txt'), 'r', encoding='unicode_escape')
+  codes = []
+  for line in fp:
+    code, uni, sym, abbr, descr = line.split('\t')
+    codes.append( Code_point(int(code,16), uni, sym, abbr, '') )
+  fp.close()
+  gc.collect()
+  # tweak a few control symbols
+  fp = open( data_path('ascii-tweaks.txt'), 'r', encoding='unicode_escape')
+  for line in fp:
+    fields = line.split('\t')
+    code = int(fields[0],16)
+    op = codes[code] # old code point to be replaced
+    np = Code_point(code, op.uni, fields[1], op.abbr, op.descr) 
+    codes[code] = np
+  fp.close()
+  gc.collect()
+
+  ####    # # === Visual control codes per ISO-2047
+  ####    fp = open( 'ascii-iso2047.txt', 'r', encoding='unicode_escape')
+  ####    self.iso2047 = self.codes.copy()
+  ####    for line in fp:
+  ####      fields = line.split('\t')
+  ####      code = int(fields[0],16)
+  ####      op = self.iso2047[code] # old code point to be replaced
+  ####      np = Code_point(code, op.uni, fields[1], op.abbr, op.descr) 
+  ####      self.iso2047[code] = np
+  ####    fp.close()
+  return tuple(codes)
+
+def bake_codes(fname=None):
+  # Writes the code table as the python module ascii_codes,
+  # after which no file is parsed at import or construction.
+  # Run again whenever the ascii-*.txt files change.
+  if fname is None: fname = data_path('ascii_codes.py')
+  codes = parse_codes()
+  fp = open( fname, 'w', encoding='utf-8' )
+  print('# Generated by upacket.bake_codes() from ascii-table.txt', file=fp)
+  print('# and ascii-tweaks.txt, do not edit by hand', file=fp)
+  print('CODES = (', file=fp)
+  for cp in codes:
+    print('  ( {!r}, {!r}, {!r}, {!r}, {!r} ),'.format(
+        cp.code, cp.uni, cp.sym, cp.abbr, cp.descr), file=fp)
+  print(')', file=fp)
+  fp.close()
+
+# MicroPython has neither str.translate() nor bytes.translate()
+TRANSLATE = hasattr(str, 'translate') and hasattr(bytes, 'translate')
+
 class Ascii:
+  # The code table and the maps built from it are loaded once
+  # per process into TABLE and shared read-only by every
+  # instance, so making an Ascii costs nothing after the first.
+  # Use Ascii.shared() to just get the one common instance.
+  TABLE = None
+  SHARED = None
   def __init__(self):
+    if Ascii.TABLE is None:
+      self.codes = load_codes()
+      self.make_tables()
+      Ascii.TABLE = ( self.codes, self.pretty_table, self.serial_table,
+                      self.abbr_map, self.invisible )
+    else:
+      self.codes, self.pretty_table, self.serial_table, \
+          self.abbr_map, self.invisible = Ascii.TABLE
 
-    #=== Initialize table of ASCII characters
-    fp = open( 'ascii-table.txt', 'r', encoding='unicode_escape')
-    self.codes = []
-    for line in fp:
-      code, uni, sym, abbr, descr = line.split('\t')
-      self.codes.append( Code_point(int(code,16), uni, sym, abbr, '') )
-    fp.close()
-    gc.collect()
-    # tweak a few control symbols
-    fp = open( 'ascii-tweaks.txt', 'r', encoding='unicode_escape')
-    for line in fp:
-      fields = line.split('\t')
-      code = int(fields[0],16)
-      op = self.codes[code] # old code point to be replaced
-      np = Code_point(code, op.uni, fields[1], op.abbr, op.descr) 
-      self.codes[code] = np
-    fp.close()
-    gc.collect()
-
-    ####    # # === Visual control codes per ISO-2047
-    ####    fp = open( 'ascii-iso2047.txt', 'r', encoding='unicode_escape')
-    ####    self.iso2047 = self.codes.copy()
-    ####    for line in fp:
-    ####      fields = line.split('\t')
-    ####      code = int(fields[0],16)
-    ####      op = self.iso2047[code] # old code point to be replaced
-    ####      np = Code_point(code, op.uni, fields[1], op.abbr, op.descr) 
-    ####      self.iso2047[code] = np
-    ####    fp.close()
+  @classmethod
+  def shared(cls):
+    if cls.SHARED is None: cls.SHARED = cls()
+    return cls.SHARED
 
-  def pretty(self, text):
-    stext = []
-    for ch in text:
-      sym = self.codes[ord(ch)].sym
-      if len(sym) > 1:
-        stext.append( '{{{}}}'.format(sym) )
+  def make_tables(self):
+    # Precomputed tables, so pretty() and serialize() are a single
+    # str.translate() and unserialize() a single pass:
+    #   pretty_table  code -> symbol, '{SYM}' if longer than one char
+    #   serial_table  code -> '{ABBR}' if invisible, else the character
+    #   abbr_map      'ABBR' -> control character
+    #   invisible     the invisible codes as bytes, for bytes.translate()
+    # The tables are lists indexed by code rather than dicts, which
+    # keeps str.translate() on its fast path even though some of the
+    # symbols are outside latin-1; characters past the end of them
+    # are left as they are.
+    self.pretty_table = [ chr(i) for i in range(256) ]
+    self.serial_table = [ chr(i) for i in range(256) ]
+    self.abbr_map = {}
+    invisible = []
+    for cp in self.codes:
+      if len(cp.sym) > 1:
+        self.pretty_table[cp.code] = '{{{}}}'.format(cp.sym)
       else:
-        stext.append( sym )
-    return ''.join(stext)
+        self.pretty_table[cp.code] = cp.sym
+      if not self.visible(chr(cp.code)):
+        self.serial_table[cp.code] = '{{{}}}'.format(cp.abbr)
+        invisible.append(cp.code)
+    for cc in self.CONTROLS:
+      self.abbr_map[self.codes[cc].abbr] = chr(cc)
+    self.invisible = bytes(invisible)
+
+  def per_char(self, table, text):
+    # what str.translate() does with the tables, for MicroPython,
+    # which has no translate()
+    return ''.join( [ table[ord(ch)] if ord(ch) < len(table) else ch for ch in text ] )
+
+  def clean(self, data):
+    # bytes-like data has nothing to escape: one C pass
+    # deleting the invisible codes leaves its length alone
+    if not TRANSLATE:
+      for b in data:
+        if b in self.invisible: return False
+      return True
+    return len(data.translate(None, self.invisible)) == len(data)
+
+  def pretty(self, text):
+    if not isinstance(text, str):
+      text = bytes(text).decode('latin_1')
+    if not TRANSLATE: return self.per_char(self.pretty_table, text)
+    return text.translate(self.pretty_table)
 
   def visible( self, ch ):
     cp = ord(ch[0])
@@ -481,18 +1236,31 @@ class Ascii:
     return True
 
   def serialize(self, text):
-    stext = []
-    for ch in text:
-      if self.visible(ch):
-        stext.append( ch )
-      else:
-        abbr = self.codes[ord(ch)].abbr
-        stext.append( '{{{}}}'.format(abbr) )
-    return ''.join(stext)
+    # str in, str out; bytes in, bytes out
+    if isinstance(text, str):
+      if not TRANSLATE: return self.per_char(self.serial_table, text)
+      return text.translate(self.serial_table)
+    data = bytes(text)
+    if self.clean(data): return data
+    return bytes(self.serialize(data.decode('latin_1')), 'latin_1')
 
   CONTROLS = list(range(32)) + [ 0x7f ]
   def unserialize(self, text):
-    for cc in self.CONTROLS:
-      abbr = '{{{}}}'.format( self.codes[cc].abbr )
-      text = text.replace(abbr, chr(cc))
-    return text
+    # single pass over the {ABBR} escapes; anything in braces
+    # that is not a control abbreviation is left as it is
+    if not isinstance(text, str):
+      return bytes(self.unserialize(bytes(text).decode('latin_1')), 'latin_1')
+    if '{' not in text: return text
+    parts = text.split('{')
+    stext = [ parts[0] ]
+    for part in parts[1:]:
+      end = part.find('}')
+      ch = None
+      if end > 0: ch = self.abbr_map.get(part[:end])
+      if ch is None:
+        stext.append('{')
+        stext.append(part)
+      else:
+        stext.append(ch)
+        stext.append(part[end+1:])
+    return ''.join(stext)